@@ -3,6 +3,11 @@ import random
 import timeit
 import math
 import argparse
+import os
+import shutil
+import tempfile
+import itertools
+import multiprocessing
 from collections import Counter
 from copy import deepcopy
 
@@ -10,6 +15,17 @@ import numpy as np
     
 import json
 
+import instrument
+from bitboard import BitboardGO, mask_positions
+from batch_go import BatchGo
+from zobrist import hash_board
+from symmetry import canonical_state, map_move, unmap_move
+from qtable import QTable, load_table, save_table, load_binary, save_binary
+from checkpoint import Checkpointer, training_state, restore_training_state
+from disk_qtable import CachedQTable, StoreCheckpointer, format_stats
+from replay import ReplayBuffer
+from game_records import GameRecorder, read_games, game_decisions, CHUNK_GAMES
+
 REWARD = [[-1, 0, 0, 0, -1],
           [0, 2, 2, 2, 0],
           [0, 2, 4, 2, 0],
@@ -72,6 +88,29 @@ class GO:
                     return False
         return True
 
+    @property
+    def zobrist(self):
+        '''
+        Zobrist hash of the current board.
+
+        :return: 64-bit hash, equal to BitboardGO.zobrist for the same board.
+        '''
+        return hash_board(self.board)
+
+    @property
+    def stones(self):
+        '''
+        Bitsets of the stones, laid out as in BitboardGO.
+
+        :return: list of bitsets indexed by piece type (index 0 unused).
+        '''
+        stones = [0, 0, 0]
+        for i in range(self.size):
+            for j in range(self.size):
+                if self.board[i][j]:
+                    stones[self.board[i][j]] |= 1 << (i * self.size + j)
+        return stones
+
     def copy_board(self):
         '''
         Copy the current board for potential testing.
@@ -275,6 +314,20 @@ class GO:
                 return False
         return True
         
+    def legal_moves_mask(self, piece_type):
+        '''
+        Find every valid placement of a piece type.
+
+        :param piece_type: 1('X') or 2('O').
+        :return: bitset with bit i * n + j set if placing at (i, j) is valid.
+        '''
+        mask = 0
+        for i in range(self.size):
+            for j in range(self.size):
+                if self.valid_place_check(i, j, piece_type, test_check = True):
+                    mask |= 1 << (i * self.size + j)
+        return mask
+
     def update_board(self, new_board):
         '''
         Update the board with new_board
@@ -351,16 +404,18 @@ class GO:
         elif cnt_1 < cnt_2 + self.komi: return 2
         else: return 0
         
-    def play(self, player1, player2, verbose=False):
+    def play(self, player1, player2, verbose=False, recorder=None):
         '''
         The game starts!
 
         :param player1: Player instance.
         :param player2: Player instance.
         :param verbose: whether print input hint and error information
+        :param recorder: GameRecorder to write the game to, or None.
         :return: piece type of winner of the game (0 if it's a tie).
         '''
         self.init_board(self.size)
+        moves = [] # Moves played, for the recorder
         # Print input hints and error message if there is a manual player
         if player1.type == 'manual' or player2.type == 'manual':
             self.verbose = True
@@ -382,6 +437,8 @@ class GO:
                         print('The game is a tie.')
                     else: 
                         print('The winner is {}'.format('X' if result == 1 else 'O'))
+                if recorder is not None:
+                    recorder.write(moves, result)
                 return result
 
             if verbose:
@@ -411,6 +468,7 @@ class GO:
                 self.visualize_board() # Visualize the board again
                 print()
 
+            moves.append(action)
             self.n_move += 1
             self.X_move = not self.X_move # Players take turn
 
@@ -426,11 +484,7 @@ class RandomPlayer():
         :param piece_type: 1('X') or 2('O').
         :return: (row, column) coordinate of input.
         '''        
-        possible_placements = []
-        for i in range(go.size):
-            for j in range(go.size):
-                if go.valid_place_check(i, j, piece_type, test_check = True):
-                    possible_placements.append((i,j))
+        possible_placements = mask_positions(go.legal_moves_mask(piece_type), go.size)
 
         if not possible_placements:
             return "PASS"
@@ -438,21 +492,42 @@ class RandomPlayer():
             return random.choice(possible_placements)
 
 def return_valid_moves(go, piece_type):
-    possible_placements = []
-    for i in range(go.size):
-        for j in range(go.size):
-            if go.valid_place_check(i, j, piece_type, test_check = True):
-                possible_placements.append((i,j))
+    possible_placements = mask_positions(go.legal_moves_mask(piece_type), go.size)
 
     if not possible_placements:
         return "PASS"
     return possible_placements
 
-def train(piece_type, epsilon, alpha, gamma, q_table, result_dict, learn):
+def q_update(q_table, row, action, reward, next_state, alpha, gamma):
+    '''
+    Apply one Q-learning update.
+
+    :param q_table: QTable.
+    :param row: row of the state the action was taken in.
+    :param action: action index.
+    :param reward: reward of the action.
+    :param next_state: hash of the state after the opponent replied.
+    :param alpha: learning rate.
+    :param gamma: discount factor.
+    :return: None.
+    '''
+    next_row = q_table.row(next_state)
+    if next_row is not None:
+        q_max_next_state = q_table.max_value(next_row)
+    else:
+        q_max_next_state = 0 
+    q_table.update(row, action, ((1-alpha) * q_table.get(row, action)) + alpha * (reward + (gamma * q_max_next_state)))
+
+def train(piece_type, epsilon, alpha, gamma, q_table, result_dict, learn, go_class=GO, symmetry=False, transitions=None, recorder=None):
     #Piece_type : My piece type; 1 = black; 2 = white
+    #q_table : QTable
+    #go_class : board backend, GO or BitboardGO
+    #symmetry : key states by their canonical orientation, with actions in that orientation
+    #transitions : if a list, (state, action, reward, next_state) are appended to it instead of updating q_table
+    #recorder : GameRecorder the game is written to, or None
 
     N = 5
-    go = GO(N)
+    go = go_class(N)
     go.init_board(N)
     #Board initialized
 
@@ -468,6 +543,7 @@ def train(piece_type, epsilon, alpha, gamma, q_table, result_dict, learn):
         opponent_piece_type = 1
 
     is_first = True
+    moves = [] #Moves of both players, for the recorder
     
     while go.game_end(my_piece_type) != True:
 
@@ -477,39 +553,49 @@ def train(piece_type, epsilon, alpha, gamma, q_table, result_dict, learn):
             go.place_chess(opponent_move[0], opponent_move[1], opponent_piece_type)
             go.remove_died_pieces(3 - opponent_piece_type)
             go.n_move += 1
+            moves.append(opponent_move)
             is_first = False
         
         #Now I make a move
         prev_score_diff = go.score(my_piece_type) - go.score(opponent_piece_type)
-        my_turn_board = deepcopy(go.board)
+        if symmetry:
+            my_turn_state, transform = canonical_state(go)
+        else:
+            my_turn_state, transform = go.zobrist, 0
 
-        if str(go.board) not in q_table:
+        my_turn_row = q_table.row(my_turn_state)
+        if my_turn_row is None:
             possible_moves = return_valid_moves(go, my_piece_type)
             if possible_moves != 'PASS':
-                q_table[str(go.board)] = dict()
-                for move in possible_moves:
-                    q_table[str(go.board)][str(move)] = 0
-                my_action = str(random.choice(possible_moves))
+                actions = [q_table.action(map_move(move, transform, N)) for move in possible_moves]
+                my_turn_row = q_table.add(my_turn_state, actions)
+                my_action = random.choice(actions)
 
             else:
                 my_action = 'PASS'
         
         else:
             if random.uniform(0, 1) < epsilon:
-                my_action = random.choice(list(q_table[str(go.board)].keys()))
+                my_action = random.choice(q_table.legal_actions(my_turn_row))
             else:
-                my_action = max(q_table[str(go.board)], key = q_table[str(go.board)].get)
+                my_action = q_table.argmax(my_turn_row)
 
             #epsilon = epsilon * 1.04
+
+        if my_turn_row is not None:
+            q_table.visit(my_turn_row)
         
         if my_action != 'PASS':
-            go.place_chess(int(my_action[1]), int(my_action[4]), my_piece_type)
+            #Back from the canonical orientation to the real board
+            my_move = unmap_move(q_table.move(my_action), transform, N)
+            go.place_chess(my_move[0], my_move[1], my_piece_type)
             go.died_pieces = go.remove_died_pieces(3 - my_piece_type)
             go.n_move += 1
         
         else:
             go.previous_board = deepcopy(go.board)
             go.n_move += 1
+        moves.append(my_move if my_action != 'PASS' else 'PASS')
 
         #go.visualize_board()
         
@@ -528,6 +614,7 @@ def train(piece_type, epsilon, alpha, gamma, q_table, result_dict, learn):
         else:
             go.previous_board = deepcopy(go.board)
             go.n_move += 1
+        moves.append(opponent_move)
         
         #go.visualize_board()
 
@@ -538,85 +625,512 @@ def train(piece_type, epsilon, alpha, gamma, q_table, result_dict, learn):
         #Update the q_value
         if learn == True:
             if my_action != 'PASS':
-                if str(go.board) in q_table:
-                    #q_max_next_state = max(q_table[str(go.board)], key = q_table[str(go.board)].get)
-                    q_max_next_state = max(list(q_table[str(go.board)].values()))
-                else:
-                    q_max_next_state = 0 
+                next_state = canonical_state(go)[0] if symmetry else go.zobrist
                 score_diff = after_score_diff - prev_score_diff
                 if score_diff != 0:
                     score_diff = score_diff * 2
-                #my_reward = REWARD[int(my_action[1])][int(my_action[4])] + (after_score_diff - prev_score_diff)
-                my_reward = REWARD[int(my_action[1])][int(my_action[4])] + score_diff             
-                q_table[str(my_turn_board)][my_action] =  ((1-alpha) * q_table[str(my_turn_board)][my_action]) + alpha * (my_reward + (gamma * q_max_next_state))
+                my_reward = REWARD[my_move[0]][my_move[1]] + score_diff             
+                if transitions is not None:
+                    transitions.append((my_turn_state, my_action, my_reward, next_state))
+                else:
+                    q_update(q_table, my_turn_row, my_action, my_reward, next_state, alpha, gamma)
  
     #The game ended
     #print('Player 1 score:', str(go.score(my_piece_type)), '\n', 'Player 2 score:', str(go.score(opponent_piece_type) + go.komi))
     #print('Player', str(go.judge_winner()), 'has won!')
-    if go.judge_winner() == 1:
+    winner = go.judge_winner()
+    if winner == 1:
         result_dict['black'] += 1
-    elif go.judge_winner() == 2:
+    elif winner == 2:
         result_dict['white'] += 1
     else:
         result_dict['draw'] += 1
+    if recorder is not None:
+        recorder.write(moves, winner, piece_type)
 
     return q_table, result_dict
 
-def main():
-    my_piece_type = 1 #black = 1; white = 2
-    alpha = 0.1
-    gamma = 0.99
-    epsilon = 0.8
-    max_exp_rate = 0.8
-    min_exp_rate = 0.01
-    exp_decay_rate = 0.000025#0.000004 
-    result_dict = {'black': 0, 'white': 0, 'draw': 0}
+def train_batch(piece_type, epsilons, alpha, gamma, q_table, result_dict, learn, symmetry=False, transitions=None, rng=None):
+    '''
+    Play one training game per epsilon against the random player, all in lockstep on a BatchGo.
+
+    Same learning as train(), but legality, captures and the random opponent
+    are computed for every game at once. Differences: two passes in a row end
+    a game whoever passed first, and a table move forbidden by the KO rule is
+    played as PASS.
+
+    :param piece_type: my piece type; 1 = black; 2 = white
+    :param epsilons: exploration rate of every game.
+    :param q_table: QTable
+    :param transitions: if a list, (state, action, reward, next_state) are appended to it instead of updating q_table
+    :param rng: numpy Generator or seed.
+    :return: (q_table, result_dict).
+    '''
+    N = 5
+    k = len(epsilons)
+    rng = np.random.default_rng(rng)
+    env = BatchGo(k, N)
+    opponent_piece_type = 3 - piece_type
+    pass_action = env.pass_action
+    mask = env.legal_moves()
+
+    #When I play White the opponent moves first
+    if piece_type == 2:
+        mask, rewards, done = env.step(env.random_actions(mask, rng))
+
+    while not env.done.all():
+        #Now I make a move in every game still running
+        prev_score_diff = env.score(piece_type) - env.score(opponent_piece_type)
+        if symmetry:
+            states, transforms = env.canonical_hashes()
+        else:
+            states, transforms = env.hashes(), [0] * k
+        actions = np.full(k, pass_action)
+        played = dict() # game -> (row, action in the table orientation, move on the real board)
+        for g in np.flatnonzero(~env.done).tolist():
+            row = q_table.row(states[g])
+            if row is None:
+                legal = np.flatnonzero(mask[g, :pass_action]).tolist()
+                if not legal:
+                    continue
+                legal = [q_table.action(map_move(q_table.move(a), transforms[g], N)) for a in legal]
+                row = q_table.add(states[g], legal)
+                my_action = legal[rng.integers(len(legal))]
+            elif rng.random() < epsilons[g]:
+                legal = q_table.legal_actions(row)
+                my_action = legal[rng.integers(len(legal))]
+            else:
+                my_action = q_table.argmax(row)
+            my_move = unmap_move(q_table.move(my_action), transforms[g], N)
+            if mask[g, my_move[0] * N + my_move[1]]:
+                actions[g] = my_move[0] * N + my_move[1]
+            played[g] = (row, my_action, my_move)
+            q_table.visit(row)
+        mask, rewards, done = env.step(actions)
+        after_score_diff = env.score(piece_type) - env.score(opponent_piece_type)
+        ended = done.copy()
+
+        #Now the opponent makes a move
+        mask, rewards, done = env.step(env.random_actions(mask, rng))
+
+        #Update the q_value of games that were still running
+        if learn == True:
+            if symmetry:
+                next_states = env.canonical_hashes()[0]
+            else:
+                next_states = env.hashes()
+            for g, (row, my_action, my_move) in played.items():
+                if ended[g]:
+                    continue
+                score_diff = int(after_score_diff[g] - prev_score_diff[g])
+                if score_diff != 0:
+                    score_diff = score_diff * 2
+                my_reward = REWARD[my_move[0]][my_move[1]] + score_diff
+                if transitions is not None:
+                    transitions.append((states[g], my_action, my_reward, next_states[g]))
+                else:
+                    q_update(q_table, row, my_action, my_reward, next_states[g], alpha, gamma)
 
-    learn = True
-    # Black Training
-    black_file_name = 'q_table_black.json'
-    black_q_file = open(black_file_name, 'r')
-    black_q_table = json.load(black_q_file)
-    black_q_file.close() 
+    winners = env.judge_winner()
+    result_dict['black'] += int((winners == 1).sum())
+    result_dict['white'] += int((winners == 2).sum())
+    result_dict['draw'] += int((winners == 0).sum())
+    return q_table, result_dict
 
-    i = 0
-    while i < 100000:#800000:
-        black_q_table, result_dict = train(my_piece_type, epsilon, alpha, gamma, black_q_table, result_dict, learn)
-        #epsilon = epsilon * 1.00065
-        i += 1
-        if learn == True:
-            epsilon = min_exp_rate + (max_exp_rate - min_exp_rate) * np.exp(-exp_decay_rate * i)
-        if i % 10000 == 0:
-            print('Game result from', str(i-10000), 'to', str(i) + ": Black won", str(result_dict['black']), 'White won', str(result_dict['white']), 'draw =', str(result_dict['draw']))
+def learn_offline(games, piece_type, alpha, gamma, q_table, reward=REWARD, score_factor=2, symmetry=False):
+    '''
+    Q-learning from recorded games, without playing them again.
+
+    Every move of piece_type updates q_table the way train() did when the
+    game was played, so the games recorded by train() rebuild its table with
+    the same reward, alpha and gamma, and other values can be tried cheaply.
+
+    :param games: iterable of (learner piece type or 0, moves, winner), as from game_records.read_games.
+    :param piece_type: color to learn; games of a learner of the other color are skipped.
+    :param q_table: QTable or CachedQTable.
+    :param reward: n*n matrix of the reward of each point.
+    :param score_factor: a change of the stone difference is multiplied by this in the reward.
+    :return: (q_table, result_dict).
+    '''
+    result_dict = {'black': 0, 'white': 0, 'draw': 0}
+    for learner, moves, winner in games:
+        if learner not in (0, piece_type):
+            continue
+        for state, legal, action, my_reward, next_state in game_decisions(moves, piece_type, reward, score_factor, symmetry):
+            row = q_table.row(state)
+            if row is None:
+                if not legal:
+                    continue
+                row = q_table.add(state, legal)
+            q_table.visit(row)
+            if next_state is not None:
+                q_update(q_table, row, action, my_reward, next_state, alpha, gamma)
+        if isinstance(q_table, CachedQTable):
+            q_table.trim()
+        result_dict[('draw', 'black', 'white')[winner]] += 1
+    return q_table, result_dict
+
+BACKENDS = {'list': GO, 'bitboard': BitboardGO}
+
+def open_checkpoint(store=None, directory=None, name=None, compact_every=10):
+    #Checkpoints in the SQLite store, in a directory, or None
+    if store:
+        return StoreCheckpointer()
+    if directory:
+        return Checkpointer(os.path.join(directory, name), compact_every)
+    return None
+
+def open_table(file_name, store=None, name=None, cache_size=100000):
+    '''
+    Load a Q-table file, or open the table in an SQLite store with a bounded cache.
+
+    The first time a table is opened in the store it is filled from the file, if there is one.
+    Without a store, a file that does not exist yet gives an empty table.
+
+    :param file_name: Q-table file (.json or .qtb).
+    :param store: SQLite file, None to keep the whole table in memory.
+    :param name: table in the store.
+    :param cache_size: states kept in memory with a store.
+    :return: QTable or CachedQTable instance.
+    '''
+    if store is None:
+        if not os.path.exists(file_name):
+            return QTable()
+        return load_table(file_name)
+    q_table = CachedQTable(store, name, cache_size)
+    if len(q_table) == 0 and os.path.exists(file_name):
+        q_table.import_table(load_table(file_name))
+    return q_table
+
+class QPlayer():
+    def __init__(self, q_table, symmetry=False):
+        '''
+        Greedy player reading a Q-table, without changing it.
 
-    if learn == True:
-        updated_q_file = open(black_file_name, 'w')
-        json.dump(black_q_table, updated_q_file)
-        updated_q_file.close()
+        :param q_table: QTable.
+        :param symmetry: the table is keyed by canonical states.
+        '''
+        self.type = 'qlearner'
+        self.q_table = q_table
+        self.symmetry = symmetry
 
-    # White Training 
-    my_piece_type = 2
+    def get_input(self, go, piece_type):
+        '''
+        :param go: Go instance.
+        :param piece_type: 1('X') or 2('O').
+        :return: best (row, column) in the table, a random valid move for unknown states, or "PASS".
+        '''
+        possible_placements = mask_positions(go.legal_moves_mask(piece_type), go.size)
+        if not possible_placements:
+            return "PASS"
+        state, transform = canonical_state(go) if self.symmetry else (go.zobrist, 0)
+        row = self.q_table.row(state)
+        if row is not None:
+            move = unmap_move(self.q_table.move(self.q_table.argmax(row)), transform, go.size)
+            if move in possible_placements:
+                return move
+        return random.choice(possible_placements)
+
+def evaluate(piece_type, q_table, games, go_class=GO, symmetry=False):
+    '''
+    Play the greedy policy of a Q-table against RandomPlayer.
+
+    :param piece_type: color of the Q-table player.
+    :param q_table: QTable, not changed.
+    :param games: number of games.
+    :return: fraction of the games won.
+    '''
+    players = [QPlayer(q_table, symmetry), RandomPlayer()]
+    if piece_type == 2:
+        players.reverse()
+    wins = 0
+    for _ in range(games):
+        go = go_class(5)
+        if go.play(players[0], players[1]) == piece_type:
+            wins += 1
+    return wins / games if games else 0.0
+
+def prune_due(q_table, start, stop, every=0, max_states=0):
+    #Prune after the games start to stop if they crossed a multiple of every, or the table is above max_states
+    return (every > 0 and stop // every > start // every) or (max_states > 0 and len(q_table) > max_states)
+
+def prune_table(piece_type, q_table, min_visits, min_spread=None, max_states=None, games=0, go_class=GO, symmetry=False):
+    '''
+    Prune a Q-table and report its size and strength against RandomPlayer before and after.
+
+    :param piece_type: color of the Q-table.
+    :param q_table: QTable, pruned in place.
+    :param min_visits: see QTable.prune.
+    :param min_spread: see QTable.prune.
+    :param max_states: see QTable.prune.
+    :param games: evaluation games before and after, 0 to skip them.
+    :return: number of states removed.
+    '''
+    states = len(q_table)
+    if games:
+        before = evaluate(piece_type, q_table, games, go_class, symmetry)
+    removed = q_table.prune(min_visits, min_spread, max_states)
+    row_bytes = q_table.values.itemsize * q_table.n_actions + 4 + 4 + 8
+    print('Pruned', removed, 'of', states, 'states,', len(q_table), 'left, about', round(len(q_table) * row_bytes / 1e6, 1), 'MB')
+    if games:
+        after = evaluate(piece_type, q_table, games, go_class, symmetry)
+        print('Win rate against RandomPlayer over', games, 'games:', round(before, 3), 'before,', round(after, 3), 'after')
+    return removed
+
+def exploration_rate(i, max_exp_rate=0.8, min_exp_rate=0.01, exp_decay_rate=0.000025):
+    #epsilon after i training games
+    return min_exp_rate + (max_exp_rate - min_exp_rate) * np.exp(-exp_decay_rate * i)
+
+def train_worker(task):
+    '''
+    Play a batch of training games against a snapshot of the Q-table.
+
+    :param task: (piece_type, snapshot file, epsilons, alpha, gamma, learn, backend, symmetry, seed), one game per epsilon.
+    :return: (states added by the worker with their legal actions, transitions, result_dict).
+    '''
+    piece_type, snapshot_file, epsilons, alpha, gamma, learn, backend, symmetry, seed = task
+    random.seed(seed)
+    q_table = load_binary(snapshot_file)
+    known = len(q_table)
+    transitions = []
+    result_dict = {'black': 0, 'white': 0, 'draw': 0}
+    for epsilon in epsilons:
+        train(piece_type, epsilon, alpha, gamma, q_table, result_dict, learn, BACKENDS[backend], symmetry, transitions)
+    # Rows are added in order, so the new states are the last ones
+    new_states = [(state, q_table.legal_actions(row)) for state, row in itertools.islice(q_table.rows.items(), known, None)]
+    return new_states, transitions, result_dict
+
+def train_parallel(jobs, episodes, workers, sync_interval, alpha, gamma, learn, backend='bitboard', symmetry=False, seed=None):
+    '''
+    Train Q-tables with games played in a pool of worker processes.
+
+    Every round, each worker plays sync_interval games per job against a
+    snapshot of the table and sends back its transitions. This process then
+    applies them to the table, so workers see each other's learning at the
+    next round.
+
+    :param jobs: list of (piece_type, QTable) trained at the same time.
+    :param episodes: number of games per job.
+    :param workers: number of worker processes.
+    :param sync_interval: games a worker plays between two snapshots.
+    :return: list of result_dict, one per job.
+    '''
+    if seed is None:
+        seed = random.randrange(1 << 30)
+    results = [{'black': 0, 'white': 0, 'draw': 0} for job in jobs]
+    snapshot_dir = tempfile.mkdtemp(prefix='q_table_')
+    pool = multiprocessing.Pool(workers)
+    try:
+        done = 0
+        while done < episodes:
+            tasks = []
+            for k, (piece_type, q_table) in enumerate(jobs):
+                snapshot_file = os.path.join(snapshot_dir, 'snapshot_{}.qtb'.format(piece_type))
+                save_binary(q_table, snapshot_file)
+                for start in range(done, min(done + workers * sync_interval, episodes), sync_interval):
+                    stop = min(start + sync_interval, episodes)
+                    epsilons = [exploration_rate(i) if learn else 0.8 for i in range(start, stop)]
+                    tasks.append((k, (piece_type, snapshot_file, epsilons, alpha, gamma, learn, backend, symmetry, seed + 2 * start + k)))
+
+            # Results come back in task order, so the updates are applied deterministically
+            outputs = pool.map(train_worker, [task for k, task in tasks])
+            for (k, task), (new_states, transitions, result_dict) in zip(tasks, outputs):
+                q_table = jobs[k][1]
+                for state, actions in new_states:
+                    if state not in q_table:
+                        q_table.add(state, actions)
+                for state, action, reward, next_state in transitions:
+                    row = q_table.row(state)
+                    q_table.visit(row)
+                    q_update(q_table, row, action, reward, next_state, alpha, gamma)
+                for key in result_dict:
+                    results[k][key] += result_dict[key]
+
+            previous = done
+            done = min(done + workers * sync_interval, episodes)
+            if done // 10000 != previous // 10000:
+                for (piece_type, q_table), result_dict in zip(jobs, results):
+                    print('Player', piece_type, 'games 0 to', str(done) + ": Black won", str(result_dict['black']), 'White won', str(result_dict['white']), 'draw =', str(result_dict['draw']), 'states =', len(q_table))
+    finally:
+        pool.close()
+        pool.join()
+        shutil.rmtree(snapshot_dir)
+    return results
+
+def train_color(piece_type, file_name, name, args, recorder=None, learn=True):
+    '''
+    Train the Q-table of one color for args.episodes games and save it.
+
+    :param piece_type: 1 for black, 2 for white.
+    :param file_name: Q-table file (.json or .qtb).
+    :param name: black or white, the table in --store and the directory in --checkpoint-dir.
+    :param args: parsed arguments of main.
+    :param recorder: GameRecorder, or None.
+    :param learn: update the Q-table.
+    :return: None.
+    '''
+    go_class = BACKENDS[args.backend]
+    symmetry = args.symmetry
+    alpha = args.alpha
+    gamma = args.gamma
+    pruning = args.prune_every > 0 or args.prune_states > 0
+    # Prune well below --prune-states, so the next pruning is not due right away
+    prune_target = args.prune_states * 3 // 4 if args.prune_states > 0 else None
     epsilon = 0.8
     result_dict = {'black': 0, 'white': 0, 'draw': 0}
-    white_file_name = 'q_table_white.json'
-    white_q_file = open(white_file_name, 'r')
-    white_q_table = json.load(white_q_file)
-    white_q_file.close()
+    q_table = open_table(file_name, args.store, name, args.cache_size)
 
     i = 0
-    while i < 100000:#800000:
-        white_q_table, result_dict = train(my_piece_type, epsilon, alpha, gamma, white_q_table, result_dict, learn)
+    checkpoint = open_checkpoint(args.store, args.checkpoint_dir, name, args.compact_every)
+    if checkpoint is not None:
+        q_table, state = checkpoint.resume(q_table)
+        if state is not None:
+            i, epsilon, result_dict = restore_training_state(state)
+            print('Resuming', name.capitalize(), 'training after', i, 'games')
+    saved = i # episode of the last checkpoint
+    replay = ReplayBuffer(args.replay_size, args.replay_batch, args.replay_ratio, args.seed) if args.replay_size > 0 else None
+    while args.batch_size > 0 and i < args.episodes:
+        stop = min(i + args.batch_size, args.episodes)
+        epsilons = [exploration_rate(j) if learn else epsilon for j in range(i, stop)]
+        transitions = [] if replay is not None else None
+        q_table, result_dict = train_batch(piece_type, epsilons, alpha, gamma, q_table, result_dict, learn, symmetry, transitions, rng=random.getrandbits(64))
+        if replay is not None:
+            replay.add(q_table, transitions)
+            replay.learn(q_table, alpha, gamma)
+        if args.store:
+            q_table.trim()
+        if pruning and prune_due(q_table, i, stop, args.prune_every, args.prune_states):
+            prune_table(piece_type, q_table, args.min_visits, args.min_spread, prune_target, args.eval_games, go_class, symmetry)
+        if stop // 10000 > i // 10000:
+            print('Game result from 0 to', str(stop) + ": Black won", str(result_dict['black']), 'White won', str(result_dict['white']), 'draw =', str(result_dict['draw']))
+            if args.store:
+                print('Q-table:', format_stats(q_table.stats()))
+        if learn == True:
+            epsilon = exploration_rate(stop)
+        if checkpoint is not None and stop // args.checkpoint_interval > i // args.checkpoint_interval:
+            checkpoint.save(q_table, training_state(stop, epsilon, result_dict))
+            saved = stop
+        i = stop
+    while i < args.episodes:#800000:
+        transitions = [] if replay is not None else None
+        q_table, result_dict = train(piece_type, epsilon, alpha, gamma, q_table, result_dict, learn, go_class, symmetry, transitions, recorder)
+        if replay is not None:
+            replay.add(q_table, transitions)
+            replay.learn(q_table, alpha, gamma)
+        if args.store:
+            q_table.trim()
         #epsilon = epsilon * 1.00065
         i += 1
+        if pruning and prune_due(q_table, i - 1, i, args.prune_every, args.prune_states):
+            prune_table(piece_type, q_table, args.min_visits, args.min_spread, prune_target, args.eval_games, go_class, symmetry)
         if learn == True:
-            epsilon = min_exp_rate + (max_exp_rate - min_exp_rate) * np.exp(-exp_decay_rate * i)
+            epsilon = exploration_rate(i)
         if i % 10000 == 0:
             print('Game result from', str(i-10000), 'to', str(i) + ": Black won", str(result_dict['black']), 'White won', str(result_dict['white']), 'draw =', str(result_dict['draw']))
+            if args.store:
+                print('Q-table:', format_stats(q_table.stats()))
+        if checkpoint is not None and i % args.checkpoint_interval == 0:
+            checkpoint.save(q_table, training_state(i, epsilon, result_dict))
+            saved = i
+
+    if checkpoint is not None:
+        if saved != i:
+            checkpoint.save(q_table, training_state(i, epsilon, result_dict))
+        checkpoint.wait()
+    if args.store:
+        q_table.close()
+    elif learn == True:
+        save_table(q_table, file_name)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='bitboard', help='board backend used for training games')
+    parser.add_argument('--black-file', default='q_table_black.json', help='black Q-table, .json or binary .qtb')
+    parser.add_argument('--white-file', default='q_table_white.json', help='white Q-table, .json or binary .qtb')
+    parser.add_argument('--symmetry', action='store_true', help='merge the 8 rotations/reflections of each state (the Q-table files must be trained this way too)')
+    parser.add_argument('--episodes', type=int, default=100000, help='training games per color')
+    parser.add_argument('--workers', type=int, default=0, help='play games in this many worker processes (0 trains in this process)')
+    parser.add_argument('--sync-interval', type=int, default=1000, help='games each worker plays between Q-table syncs')
+    parser.add_argument('--together', action='store_true', help='with --workers, train black and white at the same time')
+    parser.add_argument('--batch-size', type=int, default=0, help='play this many games in lockstep on a BatchGo (0 plays one game at a time)')
+    parser.add_argument('--profile', help='record calls and time of the hot paths to this file at exit (.folded for flame graphs, else json); also set by GO_PROFILE')
+    parser.add_argument('--checkpoint-dir', help='checkpoint training here and resume from the last checkpoint found')
+    parser.add_argument('--checkpoint-interval', type=int, default=10000, help='games between checkpoints')
+    parser.add_argument('--compact-every', type=int, default=10, help='checkpoints between full snapshots (the others only log changed states)')
+    parser.add_argument('--seed', type=int, help='seed of the random generator')
+    parser.add_argument('--store', help='keep the Q-tables in this SQLite file, with only --cache-size states of each in memory; it is committed every --checkpoint-interval games with the training state, and training resumes from it')
+    parser.add_argument('--cache-size', type=int, default=100000, help='states of each Q-table kept in memory with --store')
+    parser.add_argument('--prune-every', type=int, default=0, help='prune the Q-table every this many games (0 never)')
+    parser.add_argument('--prune-states', type=int, default=0, help='prune the Q-table when it holds more states than this (0 never)')
+    parser.add_argument('--min-visits', type=int, default=2, help='pruning keeps the states played from at least this many times')
+    parser.add_argument('--min-spread', type=float, help='pruning also keeps the states whose legal values differ by at least this much')
+    parser.add_argument('--eval-games', type=int, default=200, help='games against RandomPlayer before and after each pruning (0 skips them)')
+    parser.add_argument('--replay-size', type=int, default=0, help='learn from a replay buffer of this many transitions instead of after every move (0 off)')
+    parser.add_argument('--replay-batch', type=int, default=256, help='transitions per replay batch update')
+    parser.add_argument('--replay-ratio', type=float, default=4.0, help='replayed updates per transition played')
+    parser.add_argument('--record', help='append the training games to chunk files in this directory')
+    parser.add_argument('--chunk-games', type=int, default=CHUNK_GAMES, help='games per chunk file with --record')
+    parser.add_argument('--learn-records', nargs='+', help='learn from these recorded games (chunk files or directories) instead of playing')
+    parser.add_argument('--alpha', type=float, default=0.1, help='learning rate')
+    parser.add_argument('--gamma', type=float, default=0.99, help='discount factor')
+    parser.add_argument('--score-factor', type=float, default=2, help='with --learn-records, reward of a change of the stone difference per stone')
+    parser.add_argument('--reward', help='with --learn-records, json file of the 5x5 reward matrix of the points')
+    args = parser.parse_args()
+    if args.store and (args.workers > 0 or args.checkpoint_dir):
+        parser.error('--store can not be combined with --workers or --checkpoint-dir (the store is its own checkpoint)')
+    if args.workers > 0 and (args.checkpoint_dir or args.batch_size > 0):
+        parser.error('--workers can not be combined with --checkpoint-dir or --batch-size')
+    pruning = args.prune_every > 0 or args.prune_states > 0
+    if pruning and (args.store or args.workers > 0):
+        parser.error('--prune-every and --prune-states can not be combined with --store or --workers')
+    # The buffer is not checkpointed, so a resumed run would not replay the same transitions
+    if args.replay_size > 0 and (args.store or args.workers > 0 or pruning or args.checkpoint_dir):
+        parser.error('--replay-size can not be combined with --store, --workers, pruning or --checkpoint-dir')
+    if args.record and (args.batch_size > 0 or args.workers > 0):
+        parser.error('--record can not be combined with --batch-size or --workers')
+    instrument.setup(args.profile)
+    if args.seed is not None:
+        random.seed(args.seed)
+    symmetry = args.symmetry
+    alpha = args.alpha
+    gamma = args.gamma
+
+    learn = True
+
+    if args.workers > 0:
+        black_q_table = load_table(args.black_file)
+        white_q_table = load_table(args.white_file)
+        jobs = [(1, black_q_table), (2, white_q_table)]
+        for group in ([jobs] if args.together else [[job] for job in jobs]):
+            train_parallel(group, args.episodes, args.workers, args.sync_interval, alpha, gamma, learn, args.backend, symmetry)
+        if learn == True:
+            save_table(black_q_table, args.black_file)
+            save_table(white_q_table, args.white_file)
+        return
+
+    if args.learn_records:
+        reward = REWARD
+        if args.reward:
+            reward_file = open(args.reward, 'r')
+            reward = json.load(reward_file)
+            reward_file.close()
+        for piece_type, file_name, name in ((1, args.black_file, 'black'), (2, args.white_file, 'white')):
+            q_table = open_table(file_name, args.store, name, args.cache_size)
+            start = timeit.default_timer()
+            q_table, result_dict = learn_offline(read_games(args.learn_records), piece_type, alpha, gamma, q_table, reward, args.score_factor, symmetry)
+            print('Learned', name, 'from', sum(result_dict.values()), 'games in', round(timeit.default_timer() - start, 1), 'seconds: Black won', str(result_dict['black']), 'White won', str(result_dict['white']), 'draw =', str(result_dict['draw']), 'states =', len(q_table))
+            if args.store:
+                q_table.close()
+            else:
+                save_table(q_table, file_name)
+        return
+
+    recorder = GameRecorder(args.record, args.chunk_games) if args.record else None
 
-    if learn == True:
-        updated_q_file = open(white_file_name, 'w')
-        json.dump(white_q_table, updated_q_file)
-        updated_q_file.close()
+    for piece_type, file_name, name in ((1, args.black_file, 'black'), (2, args.white_file, 'white')):
+        train_color(piece_type, file_name, name, args, recorder, learn)
+    if recorder is not None:
+        recorder.close()
  
 
 if __name__ == '__main__':
@@ -0,0 +1,279 @@
+import numpy as np
+
+from zobrist import zobrist_keys
+from symmetry import transforms
+
+def neighbors(x, fill):
+    '''
+    Look at the four neighbors of every point of a stack of boards.
+
+    :param x: array of shape (K, N, N).
+    :param fill: value seen for neighbors off the board.
+    :return: list of 4 arrays of shape (K, N, N) (views of one padded copy), out[d][k, i, j] = x[k, neighbor d of (i, j)].
+    '''
+    k, n = x.shape[0], x.shape[1]
+    padded = np.full((k, n + 2, n + 2), fill, dtype=x.dtype)
+    padded[:, 1:-1, 1:-1] = x
+    return [padded[:, :-2, 1:-1], padded[:, 2:, 1:-1], padded[:, 1:-1, :-2], padded[:, 1:-1, 2:]]
+
+class BatchGo:
+    def __init__(self, k, n=5):
+        '''
+        K games of Go played in lockstep on one (K, N, N) array.
+
+        Follows the rules of GO in Q_Learning.py: a placement must leave its
+        group a liberty after the opponent's dead stones are removed, the KO
+        rule compares with the previous board when the last placement
+        captured, a game stops after max_move = n*n - 1 moves or two passes
+        in a row, and judge_winner adds komi = n/2 to white.
+
+        :param k: number of games.
+        :param n: size of the board n*n
+        '''
+        self.k = k
+        self.size = n
+        self.max_move = n * n - 1
+        self.komi = n/2
+        self.pass_action = n * n
+        self.points = np.arange(n * n).reshape(1, n, n)
+        keys = zobrist_keys(n)
+        self.keys = np.array([keys[0], keys[1], keys[2]], dtype=np.uint64)
+        self.perms = np.array(transforms(n))
+        self.reset()
+
+    def reset(self):
+        '''
+        Start K new games on empty boards.
+
+        :return: legal-move mask of black, shape (K, N*N + 1).
+        '''
+        k, n = self.k, self.size
+        self.boards = np.zeros((k, n, n), dtype=np.int8)
+        self.previous_boards = np.zeros((k, n, n), dtype=np.int8)
+        self.ko_point = np.full(k, -1, dtype=np.int64) # the single stone the last placement captured, -1 if none
+        self.n_move = np.zeros(k, dtype=np.int32)
+        self.to_move = np.ones(k, dtype=np.int8) # piece type of the player to move
+        self.done = np.zeros(k, dtype=bool)
+        return self.legal_moves()
+
+    def label_groups(self, boards):
+        '''
+        Label the connected groups of every board.
+
+        :param boards: array of shape (K, N, N).
+        :return: labels of shape (K, N, N), the smallest point index of the group for stones and N*N for empty points.
+        '''
+        k, n = boards.shape[0], self.size
+        empty_label = n * n
+        labels = np.where(boards > 0, self.points, empty_label)
+        same = [(colors == boards) & (boards > 0) for colors in neighbors(boards, 0)]
+        padded = np.full((k, n + 2, n + 2), empty_label, dtype=labels.dtype)
+        inner = padded[:, 1:-1, 1:-1]
+        views = [padded[:, :-2, 1:-1], padded[:, 2:, 1:-1], padded[:, 1:-1, :-2], padded[:, 1:-1, 2:]]
+        # Spread the smallest label through each group until nothing changes
+        while True:
+            inner[...] = labels
+            new_labels = labels.copy()
+            for d in range(4):
+                np.minimum(new_labels, np.where(same[d], views[d], empty_label), out=new_labels)
+            if np.array_equal(new_labels, labels):
+                return labels
+            labels = new_labels
+
+    def liberty_bounds(self, boards, labels):
+        '''
+        Find the smallest and largest liberty of every group.
+
+        A group has no liberty if its largest liberty is -1, exactly one if
+        both bounds are equal and more than one otherwise.
+
+        :param boards: array of shape (K, N, N).
+        :param labels: group labels from label_groups.
+        :return: (lowest, highest), arrays of shape (K * N*N,) indexed by k * N*N + label.
+        '''
+        nn = self.size * self.size
+        lowest = np.full(self.k * nn, nn, dtype=np.int64)
+        highest = np.full(self.k * nn, -1, dtype=np.int64)
+        empty = boards == 0
+        for neighbor_labels in neighbors(labels, nn):
+            kk, ii, jj = np.nonzero(empty & (neighbor_labels < nn))
+            groups = kk * nn + neighbor_labels[kk, ii, jj]
+            liberty = ii * self.size + jj
+            np.minimum.at(lowest, groups, liberty)
+            np.maximum.at(highest, groups, liberty)
+        return lowest, highest
+
+    def legal_moves(self, piece_types=None):
+        '''
+        Compute the legal-move mask of every game.
+
+        :param piece_types: piece type to check per game, the player to move by default.
+        :return: bool array of shape (K, N*N + 1); the last column is PASS, always allowed.
+        '''
+        if piece_types is None:
+            piece_types = self.to_move
+        k, n = self.k, self.size
+        nn = n * n
+        boards = self.boards
+        own = piece_types.reshape(k, 1, 1).astype(np.int8)
+        labels = self.label_groups(boards)
+        lowest, highest = self.liberty_bounds(boards, labels)
+        base = (np.arange(k) * nn).reshape(k, 1, 1)
+        empty = boards == 0
+
+        has_liberty = np.zeros_like(empty)
+        captures = np.zeros_like(empty)
+        for neighbor_colors, neighbor_labels in zip(neighbors(boards, -1), neighbors(labels, nn)):
+            neighbor_groups = base + np.minimum(neighbor_labels, nn - 1)
+            group_lowest = lowest[neighbor_groups]
+            group_highest = highest[neighbor_groups]
+            # An empty neighbor, or an own group with another liberty
+            has_liberty |= neighbor_colors == 0
+            has_liberty |= (neighbor_colors == own) & (group_lowest < group_highest)
+            # An opponent group whose last liberty is this point
+            captures |= (neighbor_colors == 3 - own) & (group_lowest == group_highest)
+
+        legal = empty & (has_liberty | captures)
+        # A placement that only lives by capturing can repeat the previous board (KO rule)
+        # only where the last placement captured a single stone
+        g = np.flatnonzero(self.ko_point >= 0)
+        ii, jj = self.ko_point[g] // n, self.ko_point[g] % n
+        candidates = captures[g, ii, jj] & ~has_liberty[g, ii, jj] & empty[g, ii, jj]
+        g, ii, jj = g[candidates], ii[candidates], jj[candidates]
+        if len(g):
+            after = boards[g].copy()
+            after[np.arange(len(g)), ii, jj] = piece_types[g]
+            self.remove_dead(after, 3 - piece_types[g])
+            repeat = (after == self.previous_boards[g]).all(axis=(1, 2))
+            legal[g[repeat], ii[repeat], jj[repeat]] = False
+
+        mask = np.ones((k, nn + 1), dtype=bool)
+        mask[:, :nn] = legal.reshape(k, nn)
+        return mask
+
+    def remove_dead(self, boards, piece_types):
+        '''
+        Remove the groups of the given piece type that have no liberty.
+
+        :param boards: array of shape (K', N, N), changed in place.
+        :param piece_types: piece type to remove per board, shape (K',).
+        :return: bool array of shape (K', N, N), the stones removed.
+        '''
+        nn = self.size * self.size
+        k = len(boards)
+        candidates = boards == piece_types.reshape(k, 1, 1)
+        labels = self.label_groups(np.where(candidates, boards, 0))
+        alive = np.zeros(k * nn + 1, dtype=bool)
+        empty = boards == 0
+        for neighbor_labels in neighbors(labels, nn):
+            kk, ii, jj = np.nonzero(empty & (neighbor_labels < nn))
+            alive[kk * nn + neighbor_labels[kk, ii, jj]] = True
+        base = (np.arange(k) * nn).reshape(k, 1, 1)
+        dead = candidates & ~alive[base + np.minimum(labels, nn - 1)]
+        boards[dead] = 0
+        return dead
+
+    def step(self, actions):
+        '''
+        Play one move in every game that is not over.
+
+        :param actions: int array of shape (K,), i * n + j or pass_action. Must be legal.
+        :return: (legal-move mask of the next player, rewards, done flags). The reward is
+                 given to the player who just moved: 1 for a win, -1 for a loss, 0 otherwise.
+        '''
+        k, n = self.k, self.size
+        nn = n * n
+        actions = np.asarray(actions)
+        active = ~self.done
+        passes = active & (actions == self.pass_action)
+        moves = active & ~passes
+        movers = self.to_move.copy()
+
+        # Two passes in a row end the game
+        same = (self.boards == self.previous_boards).all(axis=(1, 2))
+        ended = passes & same
+
+        self.previous_boards[active] = self.boards[active]
+        g = np.flatnonzero(moves)
+        if len(g):
+            points = actions[g]
+            self.boards[g, points // n, points % n] = movers[g]
+            boards = self.boards[g]
+            removed = self.remove_dead(boards, 3 - movers[g]).reshape(len(g), nn)
+            self.boards[g] = boards
+            single = removed.sum(axis=1) == 1
+            self.ko_point[g] = np.where(single, np.argmax(removed, axis=1), -1)
+        self.ko_point[passes] = -1
+
+        self.n_move[active] += 1
+        self.to_move[active] = 3 - self.to_move[active]
+        self.done |= ended | (active & (self.n_move >= self.max_move))
+
+        rewards = np.zeros(k, dtype=np.float32)
+        finished = active & self.done
+        winners = self.judge_winner()
+        rewards[finished & (winners == movers)] = 1
+        rewards[finished & (winners == 3 - movers)] = -1
+        return self.legal_moves(), rewards, self.done.copy()
+
+    def score(self, piece_type):
+        return (self.boards == piece_type).sum(axis=(1, 2))
+
+    def judge_winner(self):
+        '''
+        Judge the winner of every game by number of pieces, with komi for white.
+
+        :return: int array of shape (K,), piece type of the winner (0 if it's a tie).
+        '''
+        cnt_1 = self.score(1)
+        cnt_2 = self.score(2) + self.komi
+        return np.where(cnt_1 > cnt_2, 1, np.where(cnt_1 < cnt_2, 2, 0))
+
+    def hashes(self):
+        '''
+        Zobrist hash of every board, equal to GO.zobrist for the same board.
+
+        :return: list of K ints.
+        '''
+        flat = self.boards.reshape(self.k, -1).astype(np.intp)
+        keys = np.take_along_axis(self.keys, flat, axis=0)
+        return np.bitwise_xor.reduce(keys, axis=1).tolist()
+
+    def canonical_hashes(self):
+        '''
+        Canonical hash of every board, equal to symmetry.canonical_state for the same board.
+
+        :return: (list of K hashes, list of K transform indices).
+        '''
+        flat = self.boards.reshape(self.k, -1).astype(np.intp)
+        hashes = np.empty((len(self.perms), self.k), dtype=np.uint64)
+        for t, perm in enumerate(self.perms):
+            keys = np.take_along_axis(self.keys[:, perm], flat, axis=0)
+            hashes[t] = np.bitwise_xor.reduce(keys, axis=1)
+        best = np.argmin(hashes, axis=0)
+        return hashes[best, np.arange(self.k)].tolist(), best.tolist()
+
+    def random_actions(self, mask, rng):
+        '''
+        Pick a random legal placement per game, or PASS when there is none, like RandomPlayer.
+
+        :param mask: legal-move mask from step or legal_moves.
+        :param rng: numpy Generator.
+        :return: int array of shape (K,).
+        '''
+        nn = self.size * self.size
+        placements = mask[:, :nn]
+        choice = np.argmax(np.where(placements, rng.random(placements.shape), -1), axis=1)
+        return np.where(placements.any(axis=1), choice, self.pass_action)
+
+    def rollout(self, rng):
+        '''
+        Play all games to the end with random moves for both sides.
+
+        :param rng: numpy Generator.
+        :return: int array of shape (K,), piece type of the winner (0 if it's a tie).
+        '''
+        mask = self.legal_moves()
+        while not self.done.all():
+            mask, rewards, done = self.step(self.random_actions(mask, rng))
+        return self.judge_winner()
@@ -0,0 +1,228 @@
+import os
+import sys
+import json
+import time
+import random
+import platform
+import tempfile
+import argparse
+
+import numpy as np
+
+import my_player3
+import Q_Learning
+from bitboard import BitboardGO
+from qtable import QTable, load_table, save_table
+
+BACKENDS = {'list': Q_Learning.GO, 'bitboard': BitboardGO}
+
+def random_position(go_class, moves, rng, n=5):
+    '''
+    Play random valid moves from the empty board.
+
+    :param go_class: board backend.
+    :param moves: number of moves to play.
+    :param rng: random.Random instance.
+    :param n: size of the board n*n
+    :return: (go, piece type to move).
+    '''
+    go = go_class(n)
+    go.init_board(n)
+    piece_type = 1
+    for _ in range(moves):
+        possible_moves = Q_Learning.return_valid_moves(go, piece_type)
+        if possible_moves == 'PASS':
+            break
+        move = rng.choice(possible_moves)
+        go.place_chess(move[0], move[1], piece_type)
+        go.died_pieces = go.remove_died_pieces(3 - piece_type)
+        go.n_move += 1
+        piece_type = 3 - piece_type
+    return go, piece_type
+
+def perft(go, piece_type, depth):
+    '''
+    Count the move sequences of a given length, passing only when there is no valid placement.
+
+    :param go: GO or BitboardGO instance, not changed.
+    :param piece_type: side to move.
+    :param depth: number of moves.
+    :return: number of leaves.
+    '''
+    if depth == 0 or go.game_end(piece_type):
+        return 1
+    possible_moves = Q_Learning.return_valid_moves(go, piece_type)
+    if possible_moves == 'PASS':
+        return perft(go, 3 - piece_type, depth - 1)
+    leaves = 0
+    for move in possible_moves:
+        child = go.copy_board()
+        child.place_chess(move[0], move[1], piece_type)
+        child.died_pieces = child.remove_died_pieces(3 - piece_type)
+        child.n_move += 1
+        leaves += perft(child, 3 - piece_type, depth - 1)
+    return leaves
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+def bench_perft(seed, depths, positions):
+    # Legal-move generation and move making on both backends, from the same positions
+    results = []
+    for backend, go_class in sorted(BACKENDS.items()):
+        for index in range(positions):
+            rng = random.Random(seed + index)
+            go, piece_type = random_position(go_class, 2 * index, rng)
+            for depth in depths:
+                leaves, seconds = timed(perft, go, piece_type, depth)
+                results.append({'backend': backend, 'position': index, 'depth': depth, 'leaves': leaves,
+                                'seconds': seconds, 'leaves_per_sec': leaves / seconds})
+    return results
+
+def bench_minimax(seed, depths, positions):
+    # Alpha-beta search of my_player3 from fixed positions
+    results = []
+    for index in range(positions):
+        rng = random.Random(seed + index)
+        go, piece_type = random_position(BitboardGO, 2 * index, rng)
+        possible_moves = my_player3.return_valid_moves(go, piece_type)
+        if possible_moves == 'PASS':
+            continue
+        for depth in depths:
+            context = my_player3.SearchContext()
+            (score, move), seconds = timed(my_player3.minimax, possible_moves, go, depth, -9999999, 9999999, True, piece_type, context)
+            results.append({'position': index, 'depth': depth, 'nodes': context.nodes, 'score': score,
+                            'move': list(move), 'seconds': seconds, 'nodes_per_sec': context.nodes / seconds})
+    return results
+
+def bench_train(seed, games):
+    # Q-learning games against RandomPlayer, starting from an empty table
+    results = []
+    alpha, gamma, epsilon = 0.1, 0.99, 0.5
+    for backend, count in sorted(games.items()):
+        random.seed(seed)
+        q_table = QTable()
+        result_dict = {'black': 0, 'white': 0, 'draw': 0}
+        start = time.perf_counter()
+        for _ in range(count):
+            Q_Learning.train(1, epsilon, alpha, gamma, q_table, result_dict, True, BACKENDS[backend])
+        seconds = time.perf_counter() - start
+        results.append({'backend': backend, 'games': count, 'states': len(q_table), 'result': result_dict,
+                        'seconds': seconds, 'games_per_sec': count / seconds})
+    count = games.get('bitboard', 0)
+    if count:
+        q_table = QTable()
+        result_dict = {'black': 0, 'white': 0, 'draw': 0}
+        start = time.perf_counter()
+        Q_Learning.train_batch(1, [epsilon] * count, alpha, gamma, q_table, result_dict, True, rng=seed)
+        seconds = time.perf_counter() - start
+        results.append({'backend': 'batch', 'games': count, 'states': len(q_table), 'result': result_dict,
+                        'seconds': seconds, 'games_per_sec': count / seconds})
+    return results
+
+def synthetic_table(size, seed, n=5):
+    # Table of random states, each with a random set of legal actions and values
+    rng = np.random.default_rng(seed)
+    q_table = QTable(n, size)
+    states = rng.integers(0, 1 << 63, size=size, dtype=np.int64).tolist()
+    for state in states:
+        actions = np.flatnonzero(rng.random(n * n) < 0.6).tolist()
+        row = q_table.add(state, actions)
+        for action in actions:
+            q_table.update(row, action, float(rng.normal()))
+    return q_table
+
+def bench_qtable(seed, sizes):
+    # Saving and loading Q-table files, json and binary
+    results = []
+    directory = tempfile.mkdtemp()
+    try:
+        for size in sizes:
+            q_table = synthetic_table(size, seed)
+            for extension in ('json', 'qtb'):
+                file_name = os.path.join(directory, 'q_table.' + extension)
+                _, dump_seconds = timed(save_table, q_table, file_name)
+                loaded, load_seconds = timed(load_table, file_name)
+                assert len(loaded) == size
+                results.append({'format': extension, 'states': size, 'bytes': os.path.getsize(file_name),
+                                'dump_seconds': dump_seconds, 'load_seconds': load_seconds})
+                os.remove(file_name)
+    finally:
+        os.rmdir(directory)
+    return results
+
+def run(seed, quick=False, sections=None):
+    '''
+    Run the benchmark suite.
+
+    :param seed: seed of the positions, games and tables.
+    :param quick: smaller workloads, for a smoke test.
+    :param sections: names of the sections to run, all by default.
+    :return: dict ready for json.
+    '''
+    if quick:
+        workloads = {'perft': ([1, 2], 2), 'minimax': ([1, 2, 3], 2), 'train': {'list': 10, 'bitboard': 200}, 'qtable': [1000, 10000]}
+    else:
+        workloads = {'perft': ([1, 2, 3], 4), 'minimax': ([1, 2, 3, 4], 4), 'train': {'list': 100, 'bitboard': 2000}, 'qtable': [1000, 10000, 100000]}
+    benches = {'perft': lambda: bench_perft(seed, *workloads['perft']),
+               'minimax': lambda: bench_minimax(seed, *workloads['minimax']),
+               'train': lambda: bench_train(seed, workloads['train']),
+               'qtable': lambda: bench_qtable(seed, workloads['qtable'])}
+    report = {'seed': seed, 'quick': quick, 'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'python': platform.python_version(), 'machine': platform.machine(), 'results': dict()}
+    for name in sections or sorted(benches):
+        print('Running', name, file=sys.stderr)
+        report['results'][name] = benches[name]()
+    return report
+
+def rates(report):
+    # Flatten a report to {metric name: rate or time}, for comparing runs
+    flat = dict()
+    for name, results in report['results'].items():
+        for result in results:
+            labels = [name] + ['{}={}'.format(key, result[key]) for key in ('backend', 'format', 'position', 'depth', 'states') if key in result]
+            for key, value in result.items():
+                if key.endswith('_per_sec') or key.endswith('seconds'):
+                    flat[' '.join(labels + [key])] = value
+    return flat
+
+def compare(old, new):
+    '''
+    Print new / old for every metric present in both reports.
+
+    :param old: earlier report.
+    :param new: current report.
+    :return: None.
+    '''
+    old_rates = rates(old)
+    for key, value in sorted(rates(new).items()):
+        if key in old_rates and old_rates[key] > 0:
+            print('{:70s} {:10.4g} {:10.4g} {:6.2f}x'.format(key, old_rates[key], value, value / old_rates[key]))
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the rules engine, the search, training and Q-table files.')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the positions, games and tables')
+    parser.add_argument('--quick', action='store_true', help='small workloads')
+    parser.add_argument('--sections', nargs='+', choices=['perft', 'minimax', 'train', 'qtable'], help='sections to run (default: all)')
+    parser.add_argument('--output', help='write the json report to this file instead of stdout')
+    parser.add_argument('--compare', help='earlier json report to compare with')
+    args = parser.parse_args()
+
+    report = run(args.seed, args.quick, args.sections)
+    if args.output:
+        out = open(args.output, 'w')
+        json.dump(report, out, indent=1)
+        out.close()
+    else:
+        json.dump(report, sys.stdout, indent=1)
+        print()
+    if args.compare:
+        old_file = open(args.compare, 'r')
+        old = json.load(old_file)
+        old_file.close()
+        compare(old, report)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,792 @@
+from zobrist import zobrist_keys
+
+_MASKS = {}
+
+def board_masks(n):
+    '''
+    Build (and cache) the bit masks used for shifting on an n*n board.
+
+    Point (i, j) is stored at bit i * n + j.
+
+    :param n: width and height of the board.
+    :return: tuple (full, not_first_col, not_last_col) of bit masks.
+    '''
+    if n not in _MASKS:
+        full = (1 << (n * n)) - 1
+        first_col = 0
+        last_col = 0
+        for i in range(n):
+            first_col |= 1 << (i * n)
+            last_col |= 1 << (i * n + n - 1)
+        _MASKS[n] = (full, full & ~first_col, full & ~last_col)
+    return _MASKS[n]
+
+def popcount(bits):
+    '''
+    Count the set bits of a bitset.
+
+    :param bits: bitset.
+    :return: number of stones in the bitset.
+    '''
+    return bin(bits).count('1')
+
+def mask_positions(bits, n):
+    '''
+    List the points of a bitset in row-major order.
+
+    :param bits: bitset.
+    :param n: width and height of the board.
+    :return: a list containing the (row, column) of every set bit.
+    '''
+    positions = []
+    while bits:
+        low = bits & -bits
+        p = low.bit_length() - 1
+        positions.append((p // n, p % n))
+        bits ^= low
+    return positions
+
+class BitboardGO:
+    def __init__(self, n):
+        '''
+        Go game with the board packed into integer bitsets, one per color.
+
+        Same interface as GO in Q_Learning.py. board and previous_board are
+        rebuilt as lists of lists on access, so mutating the returned lists
+        does not change the game; assign them back instead.
+
+        :param n: size of the board n*n
+        '''
+        self.size = n
+        self.X_move = True # X chess plays first
+        self.died_pieces = [] # Intialize died pieces to be empty
+        self.n_move = 0 # Trace the number of moves
+        self.max_move = n * n - 1 # The max movement of a Go game
+        self.komi = n/2 # Komi rule
+        self.verbose = False # Verbose only when there is a manual player
+        self.full, self.not_first_col, self.not_last_col = board_masks(n)
+        self.stones = [0, 0, 0] # Bitsets indexed by piece type, index 0 unused
+        self.previous_stones = [0, 0, 0]
+        self.chains = [0] * (n * n) # Bitset of the chain holding each point, 0 if empty
+        self.suspects = 0 # Every chain without liberty has a point in this bitset
+        self.keys = zobrist_keys(n)
+        self._zobrist = 0 # Zobrist hash of the current board
+        self.undo_stack = [] # State saved by make_move for unmake_move
+
+    def init_board(self, n):
+        '''
+        Initialize a board with size n*n.
+
+        :param n: width and height of the board.
+        :return: None.
+        '''
+        self.stones = [0, 0, 0]
+        self.previous_stones = [0, 0, 0]
+        self.chains = [0] * (n * n)
+        self.suspects = 0
+        self._zobrist = 0
+        self.undo_stack = []
+
+    def to_bits(self, board):
+        '''
+        Pack a list-of-lists board into bitsets.
+
+        :param board: board with 0 for empty, 1 for 'X' and 2 for 'O'.
+        :return: list of bitsets indexed by piece type.
+        '''
+        n = self.size
+        stones = [0, 0, 0]
+        for i in range(n):
+            for j in range(n):
+                if board[i][j]:
+                    stones[board[i][j]] |= 1 << (i * n + j)
+        return stones
+
+    def to_board(self, stones):
+        '''
+        Unpack bitsets into a list-of-lists board.
+
+        :param stones: list of bitsets indexed by piece type.
+        :return: board with 0 for empty, 1 for 'X' and 2 for 'O'.
+        '''
+        n = self.size
+        black = stones[1]
+        white = stones[2]
+        board = []
+        for i in range(n):
+            row = []
+            for j in range(n):
+                bit = 1 << (i * n + j)
+                row.append(1 if black & bit else 2 if white & bit else 0)
+            board.append(row)
+        return board
+
+    @property
+    def zobrist(self):
+        '''
+        Zobrist hash of the current board, kept up to date on placement and capture.
+        '''
+        return self._zobrist
+
+    @property
+    def board(self):
+        return self.to_board(self.stones)
+
+    @board.setter
+    def board(self, board):
+        self.stones = self.to_bits(board)
+        self.rebuild_chains()
+        keys = self.keys
+        h = 0
+        for piece_type in (1, 2):
+            for p in self.points(self.stones[piece_type]):
+                h ^= keys[piece_type][p]
+        self._zobrist = h
+
+    @property
+    def previous_board(self):
+        return self.to_board(self.previous_stones)
+
+    @previous_board.setter
+    def previous_board(self, board):
+        self.previous_stones = self.to_bits(board)
+
+    def set_board(self, piece_type, previous_board, board):
+        '''
+        Initialize board status.
+        :param previous_board: previous board state.
+        :param board: current board state.
+        :return: None.
+        '''
+        self.previous_board = previous_board
+        self.board = board
+        lost = self.previous_stones[piece_type] & ~self.stones[piece_type]
+        self.died_pieces.extend(self.positions(lost))
+
+    def compare_board(self, board1, board2):
+        for i in range(self.size):
+            for j in range(self.size):
+                if board1[i][j] != board2[i][j]:
+                    return False
+        return True
+
+    def copy_board(self):
+        '''
+        Copy the current board for potential testing.
+
+        :param: None.
+        :return: the copied board instance.
+        '''
+        new_go = BitboardGO.__new__(BitboardGO)
+        new_go.__dict__.update(self.__dict__)
+        new_go.stones = list(self.stones)
+        new_go.previous_stones = list(self.previous_stones)
+        new_go.chains = list(self.chains)
+        new_go.died_pieces = list(self.died_pieces)
+        new_go.undo_stack = list(self.undo_stack)
+        return new_go
+
+    def bit(self, i, j):
+        return 1 << (i * self.size + j)
+
+    def points(self, bits):
+        '''
+        List the point indices of a bitset in increasing order.
+
+        :param bits: bitset.
+        :return: a list containing the index i * n + j of every set bit.
+        '''
+        points = []
+        while bits:
+            low = bits & -bits
+            points.append(low.bit_length() - 1)
+            bits ^= low
+        return points
+
+    def positions(self, bits):
+        '''
+        List the points of a bitset in row-major order.
+
+        :param bits: bitset.
+        :return: a list containing the (row, column) of every set bit.
+        '''
+        return mask_positions(bits, self.size)
+
+    def shift(self, bits):
+        '''
+        Shift a bitset by one step in each of the four directions.
+
+        :param bits: bitset.
+        :return: bitset of the points adjacent to some point of bits.
+        '''
+        n = self.size
+        return ((bits >> n) | ((bits << n) & self.full)
+                | ((bits >> 1) & self.not_last_col) | ((bits << 1) & self.not_first_col))
+
+    def dilate(self, bits):
+        '''
+        Grow a bitset by one step in the four directions.
+
+        :param bits: bitset.
+        :return: bitset of the points in bits or adjacent to them.
+        '''
+        return bits | self.shift(bits)
+
+    def flood(self, seed, mask):
+        '''
+        Flood fill from seed through the points of mask.
+
+        :param seed: bitset to start from, must be a subset of mask.
+        :param mask: bitset of points the fill may enter.
+        :return: bitset of the connected group.
+        '''
+        group = seed
+        while True:
+            grown = self.dilate(group) & mask
+            if grown == group:
+                return group
+            group = grown
+
+    def empty(self):
+        return self.full & ~(self.stones[1] | self.stones[2])
+
+    def set_chain(self, chain):
+        chains = self.chains
+        for p in self.points(chain):
+            chains[p] = chain
+
+    def rebuild_chains(self):
+        '''
+        Recompute the chain of every stone and the suspect points from scratch.
+
+        :return: None.
+        '''
+        self.chains = [0] * (self.size * self.size)
+        self.suspects = 0
+        empty = self.empty()
+        for piece_type in (1, 2):
+            own = self.stones[piece_type]
+            remaining = own
+            while remaining:
+                chain = self.flood(remaining & -remaining, own)
+                remaining &= ~chain
+                self.set_chain(chain)
+                if not self.shift(chain) & empty:
+                    self.suspects |= chain
+
+    def liberties(self, chain):
+        '''
+        Find the liberties of a chain.
+
+        :param chain: bitset of the chain.
+        :return: bitset of the empty points next to the chain.
+        '''
+        return self.shift(chain) & self.empty()
+
+    def dead_chains(self, candidates, stones, empty):
+        '''
+        Find the chains without liberty among those touching some candidate point.
+
+        :param candidates: bitset of points whose chains are checked.
+        :param stones: bitset of the stones of one piece type.
+        :param empty: bitset of the empty points.
+        :return: bitset of the dead stones.
+        '''
+        chains = self.chains
+        dead = 0
+        remaining = candidates & stones
+        while remaining:
+            chain = chains[(remaining & -remaining).bit_length() - 1]
+            remaining &= ~chain
+            if not self.shift(chain) & empty:
+                dead |= chain
+        return dead
+
+    def dead_groups(self, piece_type):
+        '''
+        Find the stones of a given piece type whose group has no liberty.
+
+        Only the chains touching a suspect point can be dead, so the rest of
+        the board is never looked at.
+
+        :param piece_type: 1('X') or 2('O').
+        :return: bitset of the dead stones.
+        '''
+        return self.dead_chains(self.suspects, self.stones[piece_type], self.empty())
+
+    def remove_bits(self, removed):
+        '''
+        Remove the stones of a bitset and split the chains they belonged to.
+
+        :param removed: bitset of the stones to be removed.
+        :return: None.
+        '''
+        stones = self.stones
+        chains = self.chains
+        keys = self.keys
+        for piece_type in (1, 2):
+            for p in self.points(stones[piece_type] & removed):
+                self._zobrist ^= keys[piece_type][p]
+        stones[1] &= ~removed
+        stones[2] &= ~removed
+        self.suspects &= ~removed
+        affected = 0
+        for p in self.points(removed):
+            affected |= chains[p]
+            chains[p] = 0
+        # Captured chains go away whole; only arbitrary removals leave pieces to relabel
+        survivors = affected & ~removed
+        while survivors:
+            seed = survivors & -survivors
+            own = stones[1] if stones[1] & seed else stones[2]
+            chain = self.flood(seed, own)
+            survivors &= ~chain
+            self.set_chain(chain)
+
+    def detect_neighbor(self, i, j):
+        '''
+        Detect all the neighbors of a given stone.
+
+        :param i: row number of the board.
+        :param j: column number of the board.
+        :return: a list containing the neighbors row and column (row, column) of position (i, j).
+        '''
+        n = self.size
+        neighbors = []
+        if i > 0: neighbors.append((i-1, j))
+        if i < n - 1: neighbors.append((i+1, j))
+        if j > 0: neighbors.append((i, j-1))
+        if j < n - 1: neighbors.append((i, j+1))
+        return neighbors
+
+    def color_at(self, bit):
+        if self.stones[1] & bit:
+            return 1
+        if self.stones[2] & bit:
+            return 2
+        return 0
+
+    def color_mask(self, bit):
+        '''
+        Bitset of the points sharing the color of a given point (empty included).
+        '''
+        color = self.color_at(bit)
+        if color == 0:
+            return self.empty()
+        return self.stones[color]
+
+    def detect_neighbor_ally(self, i, j):
+        '''
+        Detect the neighbor allies of a given stone.
+
+        :param i: row number of the board.
+        :param j: column number of the board.
+        :return: a list containing the neighbored allies row and column (row, column) of position (i, j).
+        '''
+        bit = self.bit(i, j)
+        return self.positions(self.shift(bit) & self.color_mask(bit))
+
+    def group(self, bit):
+        chain = self.chains[bit.bit_length() - 1]
+        if chain:
+            return chain
+        return self.flood(bit, self.empty())
+
+    def ally_dfs(self, i, j):
+        '''
+        Search for all allies of a given stone.
+
+        :param i: row number of the board.
+        :param j: column number of the board.
+        :return: a list containing the all allies row and column (row, column) of position (i, j).
+        '''
+        return self.positions(self.group(self.bit(i, j)))
+
+    def find_liberty(self, i, j):
+        '''
+        Find liberty of a given stone. If a group of allied stones has no liberty, they all die.
+
+        :param i: row number of the board.
+        :param j: column number of the board.
+        :return: boolean indicating whether the given stone still has liberty.
+        '''
+        return bool(self.liberties(self.group(self.bit(i, j))))
+
+    def find_died_pieces(self, piece_type):
+        '''
+        Find the died stones that has no liberty in the board for a given piece type.
+
+        :param piece_type: 1('X') or 2('O').
+        :return: a list containing the dead pieces row and column(row, column).
+        '''
+        return self.positions(self.dead_groups(piece_type))
+
+    def remove_died_pieces(self, piece_type):
+        '''
+        Remove the dead stones in the board.
+
+        :param piece_type: 1('X') or 2('O').
+        :return: locations of dead pieces.
+        '''
+        dead = self.dead_groups(piece_type)
+        # Every suspect chain of this piece type is now either checked alive or removed
+        self.suspects &= ~self.stones[piece_type]
+        if not dead: return []
+        self.remove_bits(dead)
+        return self.positions(dead)
+
+    def remove_certain_pieces(self, positions):
+        '''
+        Remove the stones of certain locations.
+
+        :param positions: a list containing the pieces to be removed row and column(row, column)
+        :return: None.
+        '''
+        removed = 0
+        for piece in positions:
+            removed |= self.bit(piece[0], piece[1])
+        self.remove_bits(removed)
+
+    def place_chess(self, i, j, piece_type):
+        '''
+        Place a chess stone in the board.
+
+        :param i: row number of the board.
+        :param j: column number of the board.
+        :param piece_type: 1('X') or 2('O').
+        :return: boolean indicating whether the placement is valid.
+        '''
+        valid_place = self.valid_place_check(i, j, piece_type)
+        if not valid_place:
+            return False
+        self.previous_stones = list(self.stones)
+        self.add_stone(i * self.size + j, piece_type)
+        return True
+
+    def add_stone(self, p, piece_type):
+        '''
+        Put a stone on an empty point and merge it with its neighbor chains.
+
+        :param p: point index i * n + j.
+        :param piece_type: 1('X') or 2('O').
+        :return: None.
+        '''
+        bit = 1 << p
+        stones = self.stones
+        stones[piece_type] |= bit
+        self._zobrist ^= self.keys[piece_type][p]
+        chain = bit
+        for q in self.points(self.shift(bit) & stones[piece_type]):
+            chain |= self.chains[q]
+        self.set_chain(chain)
+        # The new chain and the neighbor chains that lost a liberty may now be dead
+        self.suspects |= self.dilate(bit) & (stones[1] | stones[2])
+
+    def legal_moves_mask(self, piece_type):
+        '''
+        Find every valid placement of a piece type in one pass.
+
+        Gives the same answer as valid_place_check on every point, but settles
+        liberties, captures and suicide per chain instead of per point.
+
+        :param piece_type: 1('X') or 2('O').
+        :return: bitset of the points where a placement is valid.
+        '''
+        own = self.stones[piece_type]
+        opponent = self.stones[3 - piece_type]
+        empty = self.full & ~(own | opponent)
+        chains = self.chains
+        # A point next to an empty point always has a liberty
+        legal = empty & self.shift(empty)
+        # So does a point next to an own chain with another liberty
+        remaining = own
+        while remaining:
+            chain = chains[(remaining & -remaining).bit_length() - 1]
+            remaining &= ~chain
+            liberties = self.shift(chain) & empty
+            if liberties & (liberties - 1):
+                legal |= liberties
+        # The last liberty of an opponent chain captures it
+        captures = 0
+        dead_opponent = False
+        remaining = opponent
+        while remaining:
+            chain = chains[(remaining & -remaining).bit_length() - 1]
+            remaining &= ~chain
+            liberties = self.shift(chain) & empty
+            if not liberties:
+                dead_opponent = True
+            elif not liberties & (liberties - 1):
+                captures |= liberties
+        # Anything else is suicide, unless a capture runs into the KO rule
+        # or an externally set board already holds dead opponent stones
+        if dead_opponent:
+            unsettled = empty & ~legal
+        elif self.died_pieces:
+            unsettled = captures & ~legal
+        else:
+            return legal | captures
+        n = self.size
+        for p in self.points(unsettled):
+            if self.valid_place_check(p // n, p % n, piece_type, test_check=True):
+                legal |= 1 << p
+        return legal
+
+    def tactics(self, i, j, piece_type):
+        '''
+        Look at what a placement does to the opponent chains next to it.
+
+        :param i: row number of the board.
+        :param j: column number of the board.
+        :param piece_type: 1('X') or 2('O').
+        :return: tuple (number of stones captured, number of chains left in atari).
+        '''
+        bit = self.bit(i, j)
+        empty = self.empty() & ~bit
+        chains = self.chains
+        captured = 0
+        ataris = 0
+        remaining = self.shift(bit) & self.stones[3 - piece_type]
+        while remaining:
+            chain = chains[(remaining & -remaining).bit_length() - 1]
+            remaining &= ~chain
+            liberties = self.shift(chain) & empty
+            if not liberties:
+                captured |= chain
+            elif not liberties & (liberties - 1):
+                ataris += 1
+        return popcount(captured), ataris
+
+    def make_move(self, move, piece_type):
+        '''
+        Play a move in place, saving what unmake_move needs to take it back.
+
+        Same effect as place_chess followed by remove_died_pieces of the
+        opponent, or for "PASS" saving the board as previous board, and then
+        n_move += 1. X_move is left to the caller. Every make_move that
+        returns is taken back by exactly one unmake_move; an invalid move
+        raises ValueError and leaves the board and the undo stack unchanged.
+
+        :param move: (row, column) or "PASS".
+        :param piece_type: 1('X') or 2('O').
+        :return: None.
+        '''
+        if move != 'PASS' and not self.valid_place_check(move[0], move[1], piece_type, test_check=True):
+            raise ValueError('invalid move {} for piece type {}'.format(move, piece_type))
+        self.undo_stack.append((self.previous_stones, self.died_pieces, self.chains,
+                                self.suspects, self._zobrist, self.n_move))
+        # The board before the move becomes the previous board (ko state); work on fresh lists
+        self.previous_stones = self.stones
+        self.stones = list(self.stones)
+        if move != 'PASS':
+            self.chains = list(self.chains)
+            self.add_stone(move[0] * self.size + move[1], piece_type)
+            self.died_pieces = self.remove_died_pieces(3 - piece_type)
+        self.n_move += 1
+
+    def unmake_move(self):
+        '''
+        Take back the last move played by make_move.
+
+        Only valid if the board has not been changed by other means since.
+
+        :return: None.
+        '''
+        self.stones = self.previous_stones
+        (self.previous_stones, self.died_pieces, self.chains,
+         self.suspects, self._zobrist, self.n_move) = self.undo_stack.pop()
+
+    def valid_place_check(self, i, j, piece_type, test_check=False):
+        '''
+        Check whether a placement is valid.
+
+        :param i: row number of the board.
+        :param j: column number of the board.
+        :param piece_type: 1(white piece) or 2(black piece).
+        :param test_check: boolean if it's a test check.
+        :return: boolean indicating whether the placement is valid.
+        '''
+        n = self.size
+        verbose = self.verbose
+        if test_check:
+            verbose = False
+
+        # Check if the place is in the board range
+        if not (i >= 0 and i < n):
+            if verbose:
+                print(('Invalid placement. row should be in the range 1 to {}.').format(n - 1))
+            return False
+        if not (j >= 0 and j < n):
+            if verbose:
+                print(('Invalid placement. column should be in the range 1 to {}.').format(n - 1))
+            return False
+
+        # Check if the place already has a piece
+        bit = self.bit(i, j)
+        if (self.stones[1] | self.stones[2]) & bit:
+            if verbose:
+                print('Invalid placement. There is already a chess in this position.')
+            return False
+
+        # Check if the place has liberty
+        own = self.stones[piece_type] | bit
+        opponent = self.stones[3 - piece_type]
+        empty = self.full & ~(own | opponent)
+        neighbors = self.shift(bit)
+        group = bit
+        for p in self.points(neighbors & own):
+            group |= self.chains[p]
+        if self.shift(group) & empty:
+            return True
+
+        # If not, remove the died pieces of opponent and check again
+        captured = self.dead_chains(neighbors | self.suspects, opponent, empty)
+        opponent &= ~captured
+        if not self.shift(group) & (empty | captured):
+            if verbose:
+                print('Invalid placement. No liberty found in this position.')
+            return False
+
+        # Check special case: repeat placement causing the repeat board state (KO rule)
+        if self.died_pieces and self.previous_stones[piece_type] == own \
+                and self.previous_stones[3 - piece_type] == opponent:
+            if verbose:
+                print('Invalid placement. A repeat move not permitted by the KO rule.')
+            return False
+        return True
+
+    def update_board(self, new_board):
+        '''
+        Update the board with new_board
+
+        :param new_board: new board.
+        :return: None.
+        '''
+        self.board = new_board
+
+    def visualize_board(self):
+        '''
+        Visualize the board.
+
+        :return: None
+        '''
+        board = self.board
+
+        print('-' * len(board) * 2)
+        for i in range(len(board)):
+            for j in range(len(board)):
+                if board[i][j] == 0:
+                    print(' ', end=' ')
+                elif board[i][j] == 1:
+                    print('X', end=' ')
+                else:
+                    print('O', end=' ')
+            print()
+        print('-' * len(board) * 2)
+
+    def game_end(self, piece_type, action="MOVE"):
+        '''
+        Check if the game should end.
+
+        :param piece_type: 1('X') or 2('O').
+        :param action: "MOVE" or "PASS".
+        :return: boolean indicating whether the game should end.
+        '''
+
+        # Case 1: max move reached
+        if self.n_move >= self.max_move:
+            return True
+        # Case 2: two players all pass the move.
+        if self.previous_stones == self.stones and action == "PASS":
+            return True
+        return False
+
+    def score(self, piece_type):
+        '''
+        Get score of a player by counting the number of stones.
+
+        :param piece_type: 1('X') or 2('O').
+        :return: number of stones of the player.
+        '''
+        return popcount(self.stones[piece_type])
+
+    def judge_winner(self):
+        '''
+        Judge the winner of the game by number of pieces for each player.
+
+        :param: None.
+        :return: piece type of winner of the game (0 if it's a tie).
+        '''
+
+        cnt_1 = self.score(1)
+        cnt_2 = self.score(2)
+        if cnt_1 > cnt_2 + self.komi: return 1
+        elif cnt_1 < cnt_2 + self.komi: return 2
+        else: return 0
+
+    def play(self, player1, player2, verbose=False, recorder=None):
+        '''
+        The game starts!
+
+        :param player1: Player instance.
+        :param player2: Player instance.
+        :param verbose: whether print input hint and error information
+        :param recorder: GameRecorder to write the game to, or None.
+        :return: piece type of winner of the game (0 if it's a tie).
+        '''
+        self.init_board(self.size)
+        moves = [] # Moves played, for the recorder
+        # Print input hints and error message if there is a manual player
+        if player1.type == 'manual' or player2.type == 'manual':
+            self.verbose = True
+            print('----------Input "exit" to exit the program----------')
+            print('X stands for black chess, O stands for white chess.')
+            self.visualize_board()
+
+        verbose = self.verbose
+        # Game starts!
+        while 1:
+            piece_type = 1 if self.X_move else 2
+
+            # Judge if the game should end
+            if self.game_end(piece_type):
+                result = self.judge_winner()
+                if verbose:
+                    print('Game ended.')
+                    if result == 0:
+                        print('The game is a tie.')
+                    else:
+                        print('The winner is {}'.format('X' if result == 1 else 'O'))
+                if recorder is not None:
+                    recorder.write(moves, result)
+                return result
+
+            if verbose:
+                player = "X" if piece_type == 1 else "O"
+                print(player + " makes move...")
+
+            # Game continues
+            if piece_type == 1: action = player1.get_input(self, piece_type)
+            else: action = player2.get_input(self, piece_type)
+
+            if verbose:
+                print(action)
+
+            if action != "PASS":
+                # If invalid input, continue the loop. Else it places a chess on the board.
+                if not self.place_chess(action[0], action[1], piece_type):
+                    if verbose:
+                        self.visualize_board()
+                    continue
+
+                self.died_pieces = self.remove_died_pieces(3 - piece_type) # Remove the dead pieces of opponent
+            else:
+                self.previous_stones = list(self.stones)
+
+            if verbose:
+                self.visualize_board() # Visualize the board again
+                print()
+
+            moves.append(action)
+            self.n_move += 1
+            self.X_move = not self.X_move # Players take turn
@@ -0,0 +1,198 @@
+import os
+import json
+import struct
+import random
+import threading
+
+import numpy as np
+
+from qtable import load_binary, save_binary
+
+# Update log layout: a sequence of batches, each a header, the training
+# state as json, the state hashes (uint64), their rows of float32 action
+# values and their uint32 visit counts. All little endian. A batch cut short
+# by a crash is ignored, and cut off on resume so new batches follow the
+# last complete one.
+LOG_MAGIC = b'QLOG'
+BATCH = struct.Struct('<4sIII') # magic, n_actions, number of rows, json length
+
+def training_state(episode, epsilon, result_dict):
+    '''
+    Everything besides the Q-table needed to resume training exactly.
+
+    :param episode: number of training games played.
+    :param epsilon: current exploration rate.
+    :param result_dict: wins so far.
+    :return: dict ready for json.
+    '''
+    version, internal, gauss_next = random.getstate()
+    return {'episode': episode, 'epsilon': epsilon, 'result_dict': dict(result_dict),
+            'random_state': [version, list(internal), gauss_next]}
+
+def restore_training_state(state):
+    '''
+    Restore the random generator and return the counters of a training state.
+
+    :param state: dict from training_state.
+    :return: (episode, epsilon, result_dict).
+    '''
+    version, internal, gauss_next = state['random_state']
+    random.setstate((version, tuple(internal), gauss_next))
+    return state['episode'], state['epsilon'], dict(state['result_dict'])
+
+def write_atomic(file_name, write):
+    # Write to a temporary file and rename it over the target, so readers see the old or the new file
+    temporary = file_name + '.tmp'
+    out = open(temporary, 'wb')
+    write(out)
+    out.flush()
+    os.fsync(out.fileno())
+    out.close()
+    os.replace(temporary, file_name)
+
+def read_log(file_name):
+    '''
+    Read the batches of an update log.
+
+    :param file_name: log file.
+    :return: (list of (training state, state hashes, rows of values, visit counts),
+        end offset of the last complete batch).
+    '''
+    batches = []
+    if not os.path.exists(file_name):
+        return batches, 0
+    log = open(file_name, 'rb')
+    data = log.read()
+    log.close()
+    offset = 0
+    while offset + BATCH.size <= len(data):
+        magic, n_actions, count, meta_length = BATCH.unpack_from(data, offset)
+        end = offset + BATCH.size + meta_length + 8 * count + 4 * count * n_actions + 4 * count
+        if magic != LOG_MAGIC or end > len(data):
+            break
+        offset += BATCH.size
+        state = json.loads(data[offset:offset + meta_length].decode())
+        offset += meta_length
+        keys = np.frombuffer(data, dtype='<u8', count=count, offset=offset)
+        offset += 8 * count
+        values = np.frombuffer(data, dtype='<f4', count=count * n_actions, offset=offset).reshape(count, n_actions)
+        offset += 4 * count * n_actions
+        visits = np.frombuffer(data, dtype='<u4', count=count, offset=offset)
+        offset = end
+        batches.append((state, keys, values, visits))
+    return batches, offset
+
+class Checkpointer:
+    def __init__(self, directory, compact_every=10):
+        '''
+        Periodic checkpoints of a Q-table and its training state.
+
+        A checkpoint appends the rows changed since the previous one to an
+        update log. Every compact_every checkpoints (and the first time) the
+        whole table is written as a new .qtb snapshot instead, then
+        snapshot.json is switched to it and the log is emptied; a crash at
+        any point leaves a snapshot that matches snapshot.json. Files are
+        written by a background thread from copies taken at the checkpoint,
+        so training goes on meanwhile.
+
+        :param directory: directory of the snapshot, its training state and the log.
+        :param compact_every: checkpoints between two snapshots.
+        '''
+        self.directory = directory
+        self.state_file = os.path.join(directory, 'snapshot.json')
+        self.log_file = os.path.join(directory, 'updates.log')
+        self.compact_every = compact_every
+        self.batches = None # log batches since the last snapshot, None before the first one
+        self.thread = None
+        os.makedirs(directory, exist_ok=True)
+
+    def resume(self, q_table):
+        '''
+        Load the last checkpoint: the snapshot with the newer log batches applied.
+
+        :param q_table: table to use if there is no checkpoint yet.
+        :return: (q_table, training state or None if there is no checkpoint).
+        '''
+        if not os.path.exists(self.state_file):
+            return q_table, None
+        state_file = open(self.state_file, 'r')
+        state = json.load(state_file)
+        state_file.close()
+        q_table = load_binary(os.path.join(self.directory, state['snapshot']))
+        # A crash between the snapshot and the truncation of the log leaves old batches; they are skipped
+        batches = 0
+        log, end = read_log(self.log_file)
+        if os.path.exists(self.log_file) and os.path.getsize(self.log_file) > end:
+            os.truncate(self.log_file, end)
+        for batch_state, keys, values, visits in log:
+            if batch_state['episode'] > state['episode']:
+                for key, row, count in zip(keys.tolist(), values, visits):
+                    row = q_table.set_row(key, row)
+                    q_table.visits[row] = count
+                state = batch_state
+                batches += 1
+        q_table.dirty = set()
+        q_table.pruned = False
+        self.batches = batches
+        return q_table, state
+
+    def save(self, q_table, state):
+        '''
+        Checkpoint the table in the background.
+
+        The log can't remove states, so the first checkpoint after a prune
+        is a snapshot.
+
+        :param q_table: QTable being trained.
+        :param state: dict from training_state.
+        :return: None.
+        '''
+        self.wait()
+        if self.batches is None or self.batches + 1 >= self.compact_every or q_table.pruned:
+            snapshot = q_table.copy()
+            q_table.dirty = set()
+            q_table.pruned = False
+            self.batches = 0
+            state = dict(state, snapshot='snapshot-{}.qtb'.format(state['episode']))
+            self.thread = threading.Thread(target=self.write_snapshot, args=(snapshot, state))
+        else:
+            rows = np.fromiter(q_table.dirty, dtype=np.int64, count=len(q_table.dirty))
+            q_table.dirty = set()
+            keys = q_table.keys[rows]
+            values = q_table.values[rows]
+            visits = q_table.visits[rows]
+            self.batches += 1
+            self.thread = threading.Thread(target=self.append_log, args=(keys, values, visits, json.dumps(state).encode()))
+        self.thread.start()
+
+    def wait(self):
+        # Let the previous checkpoint finish writing
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def write_snapshot(self, snapshot, state):
+        # Written under another name, so a snapshot that snapshot.json points to is never half written
+        snapshot_file = os.path.join(self.directory, state['snapshot'])
+        save_binary(snapshot, snapshot_file + '.tmp')
+        out = open(snapshot_file + '.tmp', 'rb+')
+        os.fsync(out.fileno())
+        out.close()
+        os.replace(snapshot_file + '.tmp', snapshot_file)
+        write_atomic(self.state_file, lambda out: out.write(json.dumps(state).encode()))
+        write_atomic(self.log_file, lambda out: None)
+        # Older snapshots are not needed once snapshot.json has moved on
+        for file_name in os.listdir(self.directory):
+            if file_name.startswith('snapshot-') and file_name != state['snapshot']:
+                os.remove(os.path.join(self.directory, file_name))
+
+    def append_log(self, keys, values, visits, meta):
+        out = open(self.log_file, 'ab')
+        out.write(BATCH.pack(LOG_MAGIC, values.shape[1], len(keys), len(meta)))
+        out.write(meta)
+        keys.astype('<u8').tofile(out)
+        values.astype('<f4').tofile(out)
+        visits.astype('<u4').tofile(out)
+        out.flush()
+        os.fsync(out.fileno())
+        out.close()
@@ -0,0 +1,272 @@
+import json
+import sqlite3
+import argparse
+from collections import OrderedDict
+
+import numpy as np
+
+from qtable import QTable, load_table, save_table
+
+try:
+    import resource
+except ImportError: # Not on Windows
+    resource = None
+
+SIGN = 1 << 63 # SQLite integers are signed 64-bit, state hashes are unsigned
+
+def to_signed(state):
+    return state - (1 << 64) if state >= SIGN else state
+
+def to_unsigned(state):
+    return state + (1 << 64) if state < 0 else state
+
+def max_rss():
+    # Peak resident memory of this process in bytes, None if unknown
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+class CachedQTable(QTable):
+    def __init__(self, file_name, name='q_table', cache_size=100000, n=5):
+        '''
+        Q-table stored in an SQLite file, with a bounded in-memory cache in front.
+
+        Only the states used recently are kept in the QTable arrays, in least
+        recently used order. trim() evicts the others down to cache_size,
+        writing back the rows changed since they were read, and the next
+        row() of an evicted state reads it back from disk. Eviction only
+        happens in trim(), so the rows handed out stay valid until then:
+        training calls it between games. Writes are committed by flush(),
+        together with the training state if one is given, so the file is its
+        own checkpoint: after a crash it holds the table as of the last flush.
+
+        :param file_name: SQLite file, created if needed.
+        :param name: table in the file, e.g. black or white.
+        :param cache_size: states kept in memory after trim().
+        :param n: size of the board n*n
+        '''
+        if not name.isidentifier():
+            raise ValueError('bad table name {}'.format(name))
+        QTable.__init__(self, n, cache_size + 1024)
+        self.rows = OrderedDict() # state hash -> row of the cache, least recently used first
+        self.free = [] # rows of evicted states
+        self.used = 0 # rows handed out so far
+        self.cache_size = cache_size
+        self.name = name
+        self.db = sqlite3.connect(file_name)
+        self.db.execute('CREATE TABLE IF NOT EXISTS {} (state INTEGER PRIMARY KEY, q BLOB NOT NULL, visits INTEGER NOT NULL)'.format(name))
+        self.db.execute('CREATE TABLE IF NOT EXISTS training (name TEXT PRIMARY KEY, state TEXT NOT NULL)')
+        self.count = self.db.execute('SELECT COUNT(*) FROM {}'.format(name)).fetchone()[0]
+        self.hits = 0
+        self.loads = 0 # lookups read from disk
+        self.absent = 0 # lookups of states neither in memory nor on disk
+        self.evictions = 0
+        self.writes = 0
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, state):
+        return state in self.rows or self.read(state) is not None
+
+    def read(self, state):
+        # (values, visits) of a stored state, or None
+        record = self.db.execute('SELECT q, visits FROM {} WHERE state = ?'.format(self.name), (to_signed(state),)).fetchone()
+        if record is None:
+            return None
+        return np.frombuffer(record[0], dtype='<f4'), record[1]
+
+    def allocate(self, state):
+        # Row of the cache for a state coming in
+        if self.free:
+            row = self.free.pop()
+        else:
+            row = self.used
+            self.used += 1
+            if row == len(self.values):
+                self.grow()
+        self.rows[state] = row
+        self.keys[row] = state
+        return row
+
+    def row(self, state):
+        '''
+        :param state: state hash.
+        :return: row of the state, read from disk if it is not in memory, or None if it has never been added.
+        '''
+        row = self.rows.get(state)
+        if row is not None:
+            self.rows.move_to_end(state)
+            self.hits += 1
+            return row
+        record = self.read(state)
+        if record is None:
+            self.absent += 1
+            return None
+        self.loads += 1
+        row = self.allocate(state)
+        self.values[row] = record[0]
+        self.row_max[row] = self.values[row].max()
+        self.visits[row] = record[1]
+        return row
+
+    def add(self, state, actions):
+        '''
+        Add a new state with all its legal actions valued 0.
+
+        :param state: state hash, not in the table yet.
+        :param actions: list of legal action indices.
+        :return: row of the new state.
+        '''
+        row = self.allocate(state)
+        self.values[row] = -np.inf
+        self.values[row, actions] = 0
+        self.row_max[row] = 0
+        self.visits[row] = 0
+        self.dirty.add(row)
+        self.count += 1
+        return row
+
+    def set_row(self, state, values):
+        row = self.row(state)
+        if row is None:
+            row = self.add(state, [])
+        self.values[row] = values
+        self.row_max[row] = self.values[row].max()
+        self.dirty.add(row)
+        return row
+
+    def write(self, rows):
+        records = [(to_signed(int(self.keys[row])), self.values[row].astype('<f4').tobytes(), int(self.visits[row])) for row in rows]
+        self.db.executemany('INSERT OR REPLACE INTO {} VALUES (?, ?, ?)'.format(self.name), records)
+        self.writes += len(records)
+
+    def trim(self):
+        '''
+        Evict the least recently used states until cache_size are left in memory.
+
+        :return: number of states evicted.
+        '''
+        excess = len(self.rows) - self.cache_size
+        if excess <= 0:
+            return 0
+        evicted = [self.rows.popitem(last=False)[1] for _ in range(excess)]
+        self.write([row for row in evicted if row in self.dirty])
+        self.dirty.difference_update(evicted)
+        self.free += evicted
+        self.evictions += excess
+        return excess
+
+    def flush(self, state=None):
+        '''
+        Write back every changed state and commit, so the file holds the whole table.
+
+        :param state: training state (dict ready for json) committed with the table, if given.
+        :return: None.
+        '''
+        self.write(sorted(self.dirty))
+        self.dirty = set()
+        if state is not None:
+            self.db.execute('INSERT OR REPLACE INTO training VALUES (?, ?)', (self.name, json.dumps(state)))
+        self.db.commit()
+
+    def training_state(self):
+        '''
+        :return: the training state of the last flush that had one, or None.
+        '''
+        record = self.db.execute('SELECT state FROM training WHERE name = ?', (self.name,)).fetchone()
+        if record is None:
+            return None
+        return json.loads(record[0])
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+    def copy(self):
+        raise TypeError('CachedQTable can not be copied, use to_table()')
+
+    def prune(self, min_visits, min_spread=None, max_states=None):
+        raise TypeError('CachedQTable can not be pruned')
+
+    def stats(self):
+        '''
+        :return: dict with the number of states, those in memory, cache hit rate and memory use.
+        '''
+        lookups = self.hits + self.loads + self.absent
+        return {'states': self.count, 'resident': len(self.rows), 'hits': self.hits, 'loads': self.loads,
+                'absent': self.absent, 'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions, 'writes': self.writes,
+                'cache_bytes': self.keys.nbytes + self.values.nbytes + self.row_max.nbytes, 'max_rss': max_rss()}
+
+    def to_table(self):
+        '''
+        Read the whole table into memory.
+
+        :return: QTable instance.
+        '''
+        self.flush()
+        table = QTable(self.n, max(1, self.count))
+        for state, values, visits in self.db.execute('SELECT state, q, visits FROM {} ORDER BY state'.format(self.name)):
+            row = table.set_row(to_unsigned(state), np.frombuffer(values, dtype='<f4'))
+            table.visits[row] = visits
+        table.dirty = set()
+        return table
+
+    def import_table(self, table):
+        '''
+        Store every state of an in-memory table, replacing those already stored.
+
+        :param table: QTable instance.
+        :return: None.
+        '''
+        self.flush()
+        for state in table.rows:
+            if state in self.rows:
+                self.free.append(self.rows.pop(state))
+        records = [(to_signed(state), table.values[row].astype('<f4').tobytes(), int(table.visits[row])) for state, row in table.rows.items()]
+        self.db.executemany('INSERT OR REPLACE INTO {} VALUES (?, ?, ?)'.format(self.name), records)
+        self.db.commit()
+        self.count = self.db.execute('SELECT COUNT(*) FROM {}'.format(self.name)).fetchone()[0]
+
+class StoreCheckpointer:
+    '''
+    Checkpoints of a CachedQTable kept in its own SQLite file, with the
+    interface of checkpoint.Checkpointer: a checkpoint commits the changed
+    states and the training state in one transaction.
+    '''
+    def resume(self, q_table):
+        return q_table, q_table.training_state()
+
+    def save(self, q_table, state):
+        q_table.flush(state)
+
+    def wait(self):
+        pass
+
+def format_stats(stats):
+    # One line for the training progress
+    line = 'states {states}, in memory {resident}, cache hit rate {hit_rate:.3f}, cache {cache_mb:.1f} MB'.format(
+        cache_mb=stats['cache_bytes'] / 1e6, **stats)
+    if stats['max_rss'] is not None:
+        line += ', max RSS {:.1f} MB'.format(stats['max_rss'] / 1e6)
+    return line
+
+def main():
+    parser = argparse.ArgumentParser(description='Copy Q-tables between .json/.qtb files and an SQLite store.')
+    parser.add_argument('command', choices=['import', 'export'], help='import a file into the store, or export the store to a file')
+    parser.add_argument('store', help='SQLite file')
+    parser.add_argument('name', help='table in the store, e.g. black or white')
+    parser.add_argument('file', help='Q-table file (.json or .qtb)')
+    args = parser.parse_args()
+
+    q_table = CachedQTable(args.store, args.name)
+    if args.command == 'import':
+        q_table.import_table(load_table(args.file))
+    else:
+        save_table(q_table.to_table(), args.file)
+    print(args.command.capitalize() + 'ed', len(q_table), 'states')
+    q_table.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+import os
+import glob
+import struct
+import argparse
+
+from bitboard import BitboardGO
+from symmetry import canonical_state, map_move
+
+# Chunk layout: header, then one record per game: a game header, then one
+# byte per move, i * n + j or n*n for PASS, from the first move of black.
+# Chunks are only appended to; a game cut short by a crash is ignored.
+MAGIC = b'GREC'
+VERSION = 1
+HEADER = struct.Struct('<4sII') # magic, version, n
+GAME = struct.Struct('<BB') # number of moves, learner piece type << 2 | winner (0 for a tie)
+CHUNK_GAMES = 100000 # Games per chunk file
+
+def encode_move(move, n=5):
+    return n * n if move == 'PASS' else move[0] * n + move[1]
+
+def decode_move(code, n=5):
+    return 'PASS' if code == n * n else (code // n, code % n)
+
+class GameRecorder:
+    def __init__(self, directory, chunk_games=CHUNK_GAMES, n=5):
+        '''
+        Append games to chunk files games-000000.bin, games-000001.bin, ... in a directory.
+
+        Every recorder starts a new chunk after the highest numbered one
+        there, so finished chunks are never written again.
+
+        :param directory: directory of the chunks, created if needed.
+        :param chunk_games: games per chunk.
+        :param n: size of the board n*n
+        '''
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.chunk_games = chunk_games
+        self.n = n
+        self.chunk = max([chunk_index(file_name) for file_name in chunk_files(directory)], default=-1) + 1
+        self.out = None
+        self.games = 0 # in the current chunk
+
+    def write(self, moves, winner, piece_type=0):
+        '''
+        Record one game.
+
+        :param moves: moves in order, (row, column) or "PASS".
+        :param winner: piece type of the winner, 0 for a tie.
+        :param piece_type: color of the player that learned from the game, 0 if none.
+        :return: None.
+        '''
+        if self.out is None or self.games == self.chunk_games:
+            self.next_chunk()
+        self.out.write(GAME.pack(len(moves), piece_type << 2 | winner))
+        self.out.write(bytes(encode_move(move, self.n) for move in moves))
+        self.games += 1
+
+    def next_chunk(self):
+        self.close()
+        self.out = open(os.path.join(self.directory, 'games-{:06d}.bin'.format(self.chunk)), 'xb')
+        self.out.write(HEADER.pack(MAGIC, VERSION, self.n))
+        self.chunk += 1
+        self.games = 0
+
+    def close(self):
+        if self.out is not None:
+            self.out.close()
+            self.out = None
+
+def chunk_files(path):
+    # Chunk files of a directory in order, or the file itself
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(path, 'games-*.bin')))
+    return [path]
+
+def chunk_index(file_name):
+    # 12 for games-000012.bin
+    return int(os.path.basename(file_name)[len('games-'):-len('.bin')])
+
+def read_games(paths):
+    '''
+    Stream the games of chunk files.
+
+    :param paths: chunk files or directories of chunks.
+    :return: generator of (learner piece type or 0, list of moves, winner).
+    '''
+    for path in paths:
+        for file_name in chunk_files(path):
+            chunk = open(file_name, 'rb')
+            data = chunk.read()
+            chunk.close()
+            magic, version, n = HEADER.unpack_from(data, 0)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError('{} is not a version {} game record file'.format(file_name, VERSION))
+            offset = HEADER.size
+            while offset + GAME.size <= len(data):
+                count, result = GAME.unpack_from(data, offset)
+                offset += GAME.size
+                if offset + count > len(data):
+                    break
+                moves = [decode_move(code, n) for code in data[offset:offset + count]]
+                offset += count
+                yield result >> 2, moves, result & 3
+
+def game_decisions(moves, piece_type, reward, score_factor=2, symmetry=False, n=5):
+    '''
+    Walk a recorded game and yield what train() sees at each move of one color.
+
+    :param moves: moves of the game in order.
+    :param piece_type: color of the learner.
+    :param reward: n*n matrix of the reward of each point.
+    :param score_factor: a change of the stone difference is multiplied by this.
+    :param symmetry: key states by their canonical orientation, with actions in that orientation.
+    :return: generator of (state, legal actions, action, reward, next state); action is None for PASS,
+        next state None when the opponent did not reply.
+    '''
+    go = BitboardGO(n)
+    go.init_board(n)
+    k = 0
+    while k < len(moves):
+        move = moves[k]
+        if k % 2 != piece_type - 1:
+            go.make_move(move, 3 - piece_type)
+            k += 1
+            continue
+        if symmetry:
+            state, transform = canonical_state(go)
+        else:
+            state, transform = go.zobrist, 0
+        legal = [encode_move(map_move(p, transform, n), n) for p in go.positions(go.legal_moves_mask(piece_type))]
+        prev_score_diff = go.score(piece_type) - go.score(3 - piece_type)
+        go.make_move(move, piece_type)
+        k += 1
+        if move == 'PASS':
+            yield state, legal, None, 0, None
+            continue
+        action = encode_move(map_move(move, transform, n), n)
+        score_diff = go.score(piece_type) - go.score(3 - piece_type) - prev_score_diff
+        if k == len(moves):
+            yield state, legal, action, 0, None
+            break
+        #The opponent's reply, after which train() updates the q_value
+        go.make_move(moves[k], 3 - piece_type)
+        k += 1
+        next_state = canonical_state(go)[0] if symmetry else go.zobrist
+        yield state, legal, action, reward[move[0]][move[1]] + score_diff * score_factor, next_state
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarize recorded games.')
+    parser.add_argument('paths', nargs='+', help='chunk files or directories of chunks')
+    args = parser.parse_args()
+
+    games = dict() # learner piece type -> [games, moves, black wins, white wins, draws]
+    for learner, moves, winner in read_games(args.paths):
+        counts = games.setdefault(learner, [0, 0, 0, 0, 0])
+        counts[0] += 1
+        counts[1] += len(moves)
+        counts[(4, 2, 3)[winner]] += 1
+    for learner, (count, moves, black, white, draw) in sorted(games.items()):
+        name = ('no learner', 'black learner', 'white learner')[learner]
+        print(name + ':', count, 'games,', round(moves / count, 1), 'moves per game, Black won', black, 'White won', white, 'draw =', draw)
+
+if __name__ == '__main__':
+    main()
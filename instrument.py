@@ -0,0 +1,169 @@
+import os
+import sys
+import json
+import time
+import atexit
+import functools
+
+ENV_VAR = 'GO_PROFILE' # File to write the profile to; instrumentation is off when unset
+
+# Hot paths wrapped by setup(), looked up in every module of this directory that is loaded
+HOT_PATHS = ['GO.valid_place_check', 'GO.copy_board', 'GO.ally_dfs', 'GO.find_died_pieces', 'GO.legal_moves_mask',
+             'BitboardGO.valid_place_check', 'BitboardGO.copy_board', 'BitboardGO.ally_dfs', 'BitboardGO.find_died_pieces',
+             'BitboardGO.legal_moves_mask', 'BitboardGO.make_move', 'BitboardGO.unmake_move',
+             'deepcopy', 'minimax', 'search_child', 'train', 'train_batch', 'MCTSPlayer.playout', 'MCTSPlayer.rollout']
+DEPTH_ARGUMENT = {'minimax': 2} # Calls counted per value of this positional argument (the search depth)
+EPISODES = {'train'} # One call is one training game; their durations are summarized
+
+_stats = dict() # name -> [calls, inclusive seconds, self seconds]
+_by_argument = dict() # name -> {argument value: calls}
+_durations = dict() # name -> list of seconds per call
+_folded = dict() # 'a;b;c' -> self seconds with that stack
+_stack = [] # names of the instrumented calls in progress
+_child = [] # time spent in instrumented callees, per frame of _stack
+_active = dict() # name -> number of frames of it in _stack (for recursion)
+_output = None
+
+def wrap(name, function):
+    '''
+    Wrap a function so its calls and time are recorded under name.
+
+    :param name: name in the report.
+    :param function: function or method to wrap.
+    :return: wrapper.
+    '''
+    stats = _stats.setdefault(name, [0, 0.0, 0.0])
+    argument = DEPTH_ARGUMENT.get(name.split('.')[-1])
+    counts = _by_argument.setdefault(name, dict()) if argument is not None else None
+    durations = _durations.setdefault(name, []) if name.split('.')[-1] in EPISODES else None
+    perf_counter = time.perf_counter
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if counts is not None and len(args) > argument:
+            counts[args[argument]] = counts.get(args[argument], 0) + 1
+        _stack.append(name)
+        _child.append(0.0)
+        _active[name] = _active.get(name, 0) + 1
+        start = perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            elapsed = perf_counter() - start
+            child = _child.pop()
+            key = ';'.join(_stack)
+            _stack.pop()
+            _active[name] -= 1
+            _folded[key] = _folded.get(key, 0.0) + elapsed - child
+            stats[0] += 1
+            stats[2] += elapsed - child
+            # Recursive calls are already inside the time of the outermost one
+            if _active[name] == 0:
+                stats[1] += elapsed
+            if durations is not None:
+                durations.append(elapsed)
+            if _child:
+                _child[-1] += elapsed
+
+    wrapper.instrumented = function
+    return wrapper
+
+def module_label(module):
+    # File name without .py, so the script run as __main__ is named as well
+    file_name = getattr(module, '__file__', None)
+    if not file_name:
+        return module.__name__
+    return os.path.splitext(os.path.basename(file_name))[0]
+
+def install(module, paths=HOT_PATHS):
+    '''
+    Wrap the hot paths found in a module.
+
+    :param module: module object.
+    :param paths: 'function' or 'Class.method' names to look for.
+    :return: list of the names wrapped.
+    '''
+    wrapped = []
+    for path in paths:
+        owner = module
+        parts = path.split('.')
+        for part in parts[:-1]:
+            owner = owner.__dict__.get(part) if hasattr(owner, '__dict__') else None
+            if owner is None:
+                break
+        if owner is None:
+            continue
+        # Only what the owner defines or imports itself, so every function is wrapped once per owner
+        function = owner.__dict__.get(parts[-1])
+        if function is None or not callable(function) or hasattr(function, 'instrumented'):
+            continue
+        # Named after the module that defines it, so a class imported elsewhere keeps one name
+        name = module_label(sys.modules.get(function.__module__, module)) + '.' + path
+        setattr(owner, parts[-1], wrap(name, function))
+        wrapped.append(name)
+    return wrapped
+
+def setup(output=None):
+    '''
+    Turn the instrumentation on if a profile file is given (or set in GO_PROFILE).
+
+    Wraps the hot paths of the modules of this directory that are already
+    loaded and writes the profile at exit. Nothing is wrapped otherwise, so
+    it costs nothing when off.
+
+    :param output: profile file; a name ending in .folded gets flame-graph stacks, anything else json.
+    :return: list of the names wrapped.
+    '''
+    global _output
+    output = output or os.environ.get(ENV_VAR)
+    if not output:
+        return []
+    directory = os.path.dirname(os.path.abspath(__file__))
+    wrapped = []
+    for module in list(sys.modules.values()):
+        file_name = getattr(module, '__file__', None)
+        if file_name and os.path.dirname(os.path.abspath(file_name)) == directory and module.__name__ != __name__:
+            wrapped += install(module)
+    if _output is None:
+        atexit.register(dump)
+    _output = output
+    return wrapped
+
+def report():
+    '''
+    :return: dict with calls, inclusive and self seconds per hot path, minimax calls per depth and training game times.
+    '''
+    functions = dict()
+    for name, (calls, seconds, self_seconds) in sorted(_stats.items()):
+        if calls:
+            functions[name] = {'calls': calls, 'seconds': seconds, 'self_seconds': self_seconds}
+    result = {'functions': functions}
+    by_depth = {name: {str(depth): calls for depth, calls in sorted(counts.items(), reverse=True)} for name, counts in _by_argument.items() if counts}
+    if by_depth:
+        result['calls_by_depth'] = by_depth
+    for name, durations in _durations.items():
+        if durations:
+            ordered = sorted(durations)
+            result.setdefault('episodes', dict())[name] = {
+                'count': len(ordered), 'mean': sum(ordered) / len(ordered), 'min': ordered[0],
+                'p50': ordered[len(ordered) // 2], 'p95': ordered[min(len(ordered) - 1, len(ordered) * 95 // 100)], 'max': ordered[-1]}
+    return result
+
+def dump(output=None):
+    '''
+    Write the profile.
+
+    :param output: file name, the one given to setup by default.
+    :return: None.
+    '''
+    output = output or _output
+    if not output:
+        return
+    out = open(output, 'w')
+    if output.endswith('.folded'):
+        # Collapsed stacks in microseconds, for flamegraph.pl or speedscope
+        for stack, seconds in sorted(_folded.items()):
+            out.write('{} {}\n'.format(stack, int(round(seconds * 1e6))))
+    else:
+        json.dump(report(), out, indent=1)
+    out.close()
@@ -0,0 +1,185 @@
+import math
+import time
+import random
+
+from bitboard import mask_positions
+
+UCT_C = 1.4 # Exploration constant of UCT
+PLAYOUTS = 2000 # Playouts per move without a time limit
+
+def position_key(go, piece_type):
+    '''
+    Identify a position for subtree reuse: side to move, board and previous board (ko state).
+
+    :param go: BitboardGO instance.
+    :param piece_type: 1('X') or 2('O'), the side to move.
+    :return: hashable key.
+    '''
+    return (piece_type, tuple(go.stones), tuple(go.previous_stones))
+
+def playout_moves(go, piece_type):
+    '''
+    Candidate moves of a playout: the valid placements, except filling an own eye.
+
+    :param go: BitboardGO instance.
+    :param piece_type: 1('X') or 2('O').
+    :return: bitset of the candidate points.
+    '''
+    # An eye is an empty point with only own stones around it
+    eyes = go.full & ~go.shift(go.full & ~go.stones[piece_type])
+    return go.legal_moves_mask(piece_type) & ~eyes
+
+class Node:
+    def __init__(self, go, piece_type, move=None, parent=None):
+        '''
+        Node of the search tree.
+
+        :param go: position of the node.
+        :param piece_type: side to move in the node.
+        :param move: move that led to the node, None for the root.
+        :param parent: parent node, None for the root.
+        '''
+        self.move = move
+        self.parent = parent
+        self.piece_type = piece_type
+        self.key = position_key(go, piece_type)
+        # The last move was a pass (at the root: the board did not change), so passing again ends the game
+        self.passed = move == 'PASS' if parent is not None else go.previous_stones == go.stones
+        self.terminal = go.n_move >= go.max_move or (move == 'PASS' and parent.passed)
+        self.untried = [] if self.terminal else mask_positions(go.legal_moves_mask(piece_type), go.size) + ['PASS']
+        self.children = []
+        self.visits = 0
+        self.wins = 0.0 # Wins of the player who played move, draws count half
+
+    def select(self, c):
+        # UCT: the child with the best mean plus exploration bonus
+        log_visits = math.log(self.visits)
+        return max(self.children, key=lambda child: child.wins / child.visits + c * math.sqrt(log_visits / child.visits))
+
+    def best_child(self):
+        # The most visited move is the most reliable one
+        return max(self.children, key=lambda child: child.visits)
+
+class MCTSPlayer():
+    def __init__(self, c=UCT_C, seed=None):
+        '''
+        Monte Carlo Tree Search player (UCT with random playouts).
+
+        Playouts pick uniformly among the valid placements that do not fill
+        an own eye and pass when there is none, until max_move or two passes
+        in a row; judge_winner (komi included) scores them. The tree is kept
+        between moves, so the subtree of the position reached is reused.
+
+        :param c: exploration constant.
+        :param seed: seed of the playout random generator.
+        '''
+        self.type = 'mcts'
+        self.c = c
+        self.rng = random.Random(seed)
+        self.root = None
+        self.playouts = 0 # Playouts of the last search
+        self.elapsed = 0.0 # Seconds of the last search
+        self.reused = 0 # Visits carried over from the previous search
+
+    def new_game(self):
+        self.root = None
+
+    def find_root(self, go, piece_type):
+        '''
+        Get the tree for a position, reusing the old tree if the position is in its first two plies.
+
+        :param go: BitboardGO instance.
+        :param piece_type: side to move.
+        :return: root node.
+        '''
+        key = position_key(go, piece_type)
+        if self.root is not None:
+            nodes = [self.root] + self.root.children
+            nodes += [grandchild for child in self.root.children for grandchild in child.children]
+            for node in nodes:
+                if node.key == key:
+                    node.parent = None
+                    node.move = None
+                    return node
+        return Node(go, piece_type)
+
+    def rollout(self, go, piece_type, passed):
+        '''
+        Play random moves to the end of the game.
+
+        :param go: position, changed in place.
+        :param piece_type: side to move.
+        :param passed: whether the last move was a pass.
+        :return: piece type of the winner (0 if it's a tie).
+        '''
+        rng = self.rng
+        n = go.size
+        while go.n_move < go.max_move:
+            points = go.points(playout_moves(go, piece_type))
+            if points:
+                p = rng.choice(points)
+                move = (p // n, p % n)
+            else:
+                if passed:
+                    break
+                move = 'PASS'
+            go.make_move(move, piece_type)
+            passed = move == 'PASS'
+            piece_type = 3 - piece_type
+        return go.judge_winner()
+
+    def playout(self, root, root_go):
+        # Selection, expansion, simulation and backpropagation of one playout
+        go = root_go.copy_board()
+        go.undo_stack = []
+        node = root
+        while not node.untried and node.children:
+            node = node.select(self.c)
+            go.make_move(node.move, 3 - node.piece_type)
+        if node.untried:
+            move = node.untried.pop(self.rng.randrange(len(node.untried)))
+            go.make_move(move, node.piece_type)
+            child = Node(go, 3 - node.piece_type, move, node)
+            node.children.append(child)
+            node = child
+        if node.terminal:
+            winner = go.judge_winner()
+        else:
+            winner = self.rollout(go, node.piece_type, node.passed)
+        while node is not None:
+            node.visits += 1
+            mover = 3 - node.piece_type
+            if winner == mover:
+                node.wins += 1
+            elif winner == 0:
+                node.wins += 0.5
+            node = node.parent
+
+    def get_input(self, go, piece_type, playouts=None, deadline=None):
+        '''
+        Search the position and pick a move.
+
+        :param go: BitboardGO instance, not changed.
+        :param piece_type: 1('X') or 2('O').
+        :param playouts: number of playouts, PLAYOUTS by default when there is no deadline.
+        :param deadline: time.time() at which to stop.
+        :return: (row, column) coordinate of input, or "PASS".
+        '''
+        if playouts is None and deadline is None:
+            playouts = PLAYOUTS
+        start = time.time()
+        root = self.find_root(go, piece_type)
+        self.root = root
+        self.reused = root.visits
+        self.playouts = 0
+        while root.untried or root.children:
+            if playouts is not None and self.playouts >= playouts:
+                break
+            if deadline is not None and self.playouts & 15 == 0 and time.time() > deadline:
+                break
+            self.playout(root, go)
+            self.playouts += 1
+        self.elapsed = time.time() - start
+        if not root.children:
+            return 'PASS'
+        return root.best_child().move
@@ -1,8 +1,34 @@
+import time
+START_TIME = time.time() #Before the other imports, the time limit counts from the start of the process
+
+import io
+import os
+import sys
+import signal
+import socket
+import traceback
+import argparse
+import socketserver
+from concurrent.futures import ProcessPoolExecutor
 from copy import deepcopy
 
 import read_write
+import instrument
+from bitboard import BitboardGO, mask_positions
+from mcts import MCTSPlayer
+from opening_book import load_book
+from tablebase import load_tablebase
 
 best_moves = [(2,2), (1,1), (1,3), (3,1), (3,3), (2,1), (1,2), (2,3), (3, 2)]
+
+TT_SIZE = 1 << 16 #Number of transposition table slots
+EXACT, LOWER, UPPER = 0, 1, 2
+
+DEPTH = 4 #Search depth without a time limit
+TIME_LIMIT = None #Seconds per move for iterative deepening, None searches to DEPTH
+TIME_MARGIN = 0.25 #Seconds kept back from TIME_LIMIT to write the answer and exit
+BOOK_FILE = 'opening_book.bin' #Built by opening_book.py; played without searching while the game is in it
+TABLEBASE_FILE = 'tablebase.bin' #Built by tablebase.py; exact moves for the last moves of the game
    
 #IMPORTANT:
 #This Class GO has been referenced from the given host.py file. 
@@ -157,6 +183,15 @@ class GO:
                 return False
         return True
          
+    def legal_moves_mask(self, piece_type):
+
+        mask = 0
+        for i in range(self.size):
+            for j in range(self.size):
+                if self.valid_place_check(i, j, piece_type):
+                    mask |= 1 << (i * self.size + j)
+        return mask
+
     def update_board(self, new_board):
        
         self.board = new_board
@@ -182,91 +217,264 @@ class GO:
 
 def return_valid_moves(go, piece_type):
     
-    possible_moves = []
-    for i in range(go.size):
-        for j in range(go.size):
-            if go.valid_place_check(i, j, piece_type):
-                possible_moves.append((i,j))
+    possible_moves = mask_positions(go.legal_moves_mask(piece_type), go.size)
 
     if possible_moves == []:
         return "PASS"
     return possible_moves
  
-def minimax(possible_moves, go, depth, alpha, beta, maximizing_player, piece_type):
+class SearchTimeout(Exception):
+    #Raised inside the search once the deadline has passed
+    pass
+
+class TranspositionTable:
+    def __init__(self, size=TT_SIZE):
+        #size is rounded down to a power of two so the slot is a mask of the key
+        self.mask = (1 << (size.bit_length() - 1)) - 1
+        self.slots = [None] * (self.mask + 1)
+        self.generation = 0
+        self.hits = 0
+
+    def key(self, go, piece_type):
+        #Board hash plus side to move and move counter; the ko state only matters after a capture
+        key = go.zobrist | (piece_type << 64) | (go.n_move << 66)
+        if go.died_pieces:
+            previous = go.previous_stones
+            key |= (1 + (previous[1] | (previous[2] << (go.size * go.size)))) << 74
+        return key
+
+    def new_search(self):
+        self.generation += 1
+
+    def probe(self, key):
+        entry = self.slots[key & self.mask]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key, depth, bound, score, move):
+        #Scores are stored from the point of view of the side to move
+        index = key & self.mask
+        entry = self.slots[index]
+        #Depth-preferred replacement, but entries from older searches always give way
+        if entry is None or entry[0] == key or entry[5] != self.generation or depth >= entry[1]:
+            self.slots[index] = (key, depth, bound, score, move, self.generation)
+
+class SearchContext:
+    def __init__(self, tt_size=TT_SIZE):
+        self.killers = dict() #depth -> up to two moves that caused a cutoff
+        self.history = dict() #(piece_type, move) -> cutoff score
+        self.tt = TranspositionTable(tt_size)
+        self.deadline = None #time.time() at which the search must stop
+        self.new_search()
+
+    def new_search(self):
+        #Keep the table, killers and history of earlier moves but age the table and reset the counters
+        self.tt.new_search()
+        self.tt.hits = 0
+        self.nodes = 0
+        self.cutoffs = 0
+        self.depth = 0 #Deepest completed iteration
+
+    def record_cutoff(self, move, depth, piece_type):
+        self.cutoffs += 1
+        killers = self.killers.setdefault(depth, [])
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[2:]
+        key = (piece_type, move)
+        self.history[key] = self.history.get(key, 0) + depth * depth
+
+def order_moves(go, possible_moves, piece_type, depth, context):
+    #Transposition table move, best_moves, then captures and ataris, then killers and history
+    killers = context.killers.get(depth, [])
+    history = context.history
+    entry = context.tt.probe(context.tt.key(go, piece_type))
+    tt_move = entry[4] if entry is not None else None
+
+    def key(move):
+        captured, ataris = go.tactics(move[0], move[1], piece_type)
+        return (move != tt_move, move not in best_moves, -captured, -ataris, move not in killers, -history.get((piece_type, move), 0))
+
+    return sorted(possible_moves, key=key)
+
+def search_child(go, depth, alpha, beta, maximizing_player, piece_type, context):
+    #Search the position after a move, answering from the transposition table when possible
+    tt = context.tt
+    key = tt.key(go, piece_type)
+    entry = tt.probe(key)
+    if entry is not None and entry[1] >= depth:
+        score, bound = entry[3], entry[2]
+        if not maximizing_player:
+            score, bound = -score, (bound if bound == EXACT else LOWER + UPPER - bound)
+        if bound == EXACT or (bound == LOWER and score >= beta) or (bound == UPPER and score <= alpha):
+            tt.hits += 1
+            return score
+
+    child_possible_moves = return_valid_moves(go, piece_type)
+    score, move = minimax(child_possible_moves, go, depth, alpha, beta, maximizing_player, piece_type, context)
+
+    if score <= alpha:
+        bound = UPPER
+    elif score >= beta:
+        bound = LOWER
+    else:
+        bound = EXACT
+    if not maximizing_player:
+        score, bound = -score, (bound if bound == EXACT else LOWER + UPPER - bound)
+    tt.store(key, depth, bound, score, move if isinstance(move, tuple) else None)
+    return score if maximizing_player else -score
+
+def minimax(possible_moves, go, depth, alpha, beta, maximizing_player, piece_type, context=None):
+    if context is None:
+        context = SearchContext()
+    context.nodes += 1
+    if context.deadline is not None and context.nodes & 31 == 0 and time.time() > context.deadline:
+        raise SearchTimeout()
+
+    #Score from the point of view of the maximizing player
+    my_piece_type = piece_type if maximizing_player else 3 - piece_type
     if depth == 0 or go.game_end(piece_type) == True:
         
-        return go.score(piece_type) - go.score(3 - piece_type), 'Dummy'
+        return go.score(my_piece_type) - go.score(3 - my_piece_type), 'Dummy'
         
 
-    if possible_moves == 'PASS': #When opponent moves are None
-        return go.score(3 - piece_type) - go.score(piece_type), 'Dummy2'
+    if possible_moves == 'PASS': #When the side to move has no moves
+        return go.score(my_piece_type) - go.score(3 - my_piece_type), 'Dummy2'
+
+    possible_moves = order_moves(go, possible_moves, piece_type, depth, context)
 
     if maximizing_player == True:
         max_score_diff = -999999999999
         for move in possible_moves:
-            test_go = go.copy_board()
-            test_board = test_go.board
+            go.make_move(move, piece_type)
 
-            test_go.place_chess(move[0], move[1], piece_type)
-            test_go.died_pieces = test_go.remove_died_pieces(3 - piece_type)
-            test_go.n_move += 1
- 
             #Child
-            child_possible_moves = return_valid_moves(test_go, 3 - piece_type)
-            score_diff, _ = minimax(child_possible_moves, test_go, depth - 1, alpha, beta, False, 3 - piece_type)
+            score_diff = search_child(go, depth - 1, alpha, beta, False, 3 - piece_type, context)
+            go.unmake_move()
 
             if score_diff > max_score_diff:
                 max_score_diff = score_diff
                 return_move = move
 
-            #max_score_diff = max(max_score_diff, score_diff)
-            
-            #alpha = max(alpha, max_score_diff)
-            #if beta <= alpha:
-            #    break
+            alpha = max(alpha, max_score_diff)
+            if beta <= alpha:
+                context.record_cutoff(move, depth, piece_type)
+                break
 
         return max_score_diff, return_move
 
     else:
         min_score_diff = 999999999999
         for move in possible_moves:
-            test_go = go.copy_board()
-            test_board = test_go.board
-
-            test_go.place_chess(move[0], move[1], piece_type)
-            test_go.died_pieces = test_go.remove_died_pieces(3 - piece_type)
-            test_go.n_move += 1
+            go.make_move(move, piece_type)
 
             #Child
-            child_possible_moves = return_valid_moves(test_go, 3 - piece_type)
-            score_diff, _ = minimax(child_possible_moves, test_go, depth - 1, alpha, beta, True, 3 - piece_type)
+            score_diff = search_child(go, depth - 1, alpha, beta, True, 3 - piece_type, context)
+            go.unmake_move()
 
             if score_diff < min_score_diff:
                 min_score_diff = score_diff
                 return_move = move
 
-            #min_score_diff = min(min_score_diff, score_diff)
-            
-            #beta = min(beta, min_score_diff)
-            #if beta <= alpha:
-            #    break
+            beta = min(beta, min_score_diff)
+            if beta <= alpha:
+                context.record_cutoff(move, depth, piece_type)
+                break
         
         return min_score_diff, return_move
 
 
-def main(go, piece_type, n):  
-   
-    depth = 2 
+def search_root_move(task):
+    #Worker side of parallel_minimax: score of one root move from the root player's point of view, and the nodes searched
+    go, depth, alpha, beta, piece_type, deadline = task
+    context = SearchContext()
+    context.deadline = deadline
+    score = search_child(go, depth, alpha, beta, False, piece_type, context)
+    return score, context.nodes
+
+def parallel_minimax(possible_moves, go, depth, piece_type, context, executor, workers):
+    #Root split over a process pool. The first move is searched here to get alpha (young brothers wait), the others in
+    #waves of `workers` moves, each wave with the alpha of the moves before it. Results are taken in move order, so the
+    #answer does not depend on which worker finishes first: the first move with the best score, as minimax gives.
+    if depth == 0 or go.game_end(piece_type) == True or possible_moves == 'PASS':
+        return minimax(possible_moves, go, depth, -9999999, 9999999, True, piece_type, context)
+    context.nodes += 1
+    alpha = -9999999
+    beta = 9999999
+    possible_moves = order_moves(go, possible_moves, piece_type, depth, context)
+
+    return_move = possible_moves[0]
+    go.make_move(return_move, piece_type)
+    max_score_diff = search_child(go, depth - 1, alpha, beta, False, 3 - piece_type, context)
+    go.unmake_move()
+
+    for start in range(1, len(possible_moves), workers):
+        alpha = max(alpha, max_score_diff)
+        wave = possible_moves[start:start + workers]
+        tasks = []
+        for move in wave:
+            child = go.copy_board()
+            child.undo_stack = []
+            child.make_move(move, piece_type)
+            tasks.append((child, depth - 1, alpha, beta, 3 - piece_type, context.deadline))
+        for move, (score_diff, nodes) in zip(wave, executor.map(search_root_move, tasks)):
+            context.nodes += nodes
+            if score_diff > max_score_diff:
+                max_score_diff = score_diff
+                return_move = move
+
+    return max_score_diff, return_move
+
+def search_root(possible_moves, go, piece_type, context, deadline, max_depth=None, executor=None, workers=0):
+    #Iterative deepening: search depth 1, 2, ... until the deadline and keep the move of the deepest completed iteration.
+    #The root result goes into the table, so every iteration starts with the previous principal variation.
+    alpha = -9999999
+    beta = 9999999
+    tt = context.tt
+    key = tt.key(go, piece_type)
+    undo_depth = len(go.undo_stack)
+    #Deeper than the end of the game changes nothing
+    if max_depth is None:
+        max_depth = go.max_move - go.n_move
+    my_action = None
+    context.deadline = deadline
+    try:
+        for depth in range(1, max(1, max_depth) + 1):
+            if executor is None:
+                score, move = minimax(possible_moves, go, depth, alpha, beta, True, piece_type, context)
+            else:
+                score, move = parallel_minimax(possible_moves, go, depth, piece_type, context, executor, workers)
+            my_action = move
+            context.depth = depth
+            tt.store(key, depth, EXACT, score, move)
+    except SearchTimeout:
+        #Take back the moves of the aborted iteration
+        while len(go.undo_stack) > undo_depth:
+            go.unmake_move()
+    finally:
+        context.deadline = None
+    if my_action is None:
+        my_action = order_moves(go, possible_moves, piece_type, 1, context)[0]
+    return my_action
+
+def choose_move(possible_moves, go, piece_type, context, deadline, depth, executor, workers):
+    #Fixed depth without a deadline, iterative deepening with one; searched in a process pool if there is an executor
+    if deadline is not None:
+        return search_root(possible_moves, go, piece_type, context, deadline, executor=executor, workers=workers)
+    if executor is not None:
+        return parallel_minimax(possible_moves, go, depth, piece_type, context, executor, workers)[1]
+    return minimax(possible_moves, go, depth, -9999999, 9999999, True, piece_type, context)[1]
+
+def main(go, piece_type, n, context=None, deadline=None, depth=DEPTH, executor=None, workers=0):  
     
     if piece_type == 1: #If black
         limit = 5
     elif piece_type == 2: #If white
         limit = 3
     
-    maximizing_player = True
-    
-    alpha = -9999999
-    beta = 9999999
+    if context is None:
+        context = SearchContext()
   
     #My turn        
     
@@ -278,7 +486,7 @@ def main(go, piece_type, n):
     
     if possible_moves != [] and len(possible_moves) > limit:
         
-        _, my_action = minimax(possible_moves, go, depth, alpha, beta, maximizing_player, piece_type)
+        my_action = choose_move(possible_moves, go, piece_type, context, deadline, depth, executor, workers)
         go.place_chess(my_action[0], my_action[1], piece_type)
         go.died_pieces = go.remove_died_pieces(3 - piece_type)
         go.n_move += 1
@@ -288,11 +496,12 @@ def main(go, piece_type, n):
         #if piece_type == 1 and len(possible_moves) < 3: #Only when I'm black and best moves < 3 are available. 
         #    possible_moves = return_valid_moves(go, piece_type)
         #else:
-        possible_moves = possible_moves + return_valid_moves(go, piece_type)
+        valid_moves = return_valid_moves(go, piece_type)
             
-        if possible_moves != 'PASS':
+        if valid_moves != 'PASS':
+            possible_moves = possible_moves + valid_moves
             #my_action = random.choice(possible_moves)
-            _, my_action = minimax(possible_moves, go, depth, alpha, beta, maximizing_player, piece_type)
+            my_action = choose_move(possible_moves, go, piece_type, context, deadline, depth, executor, workers)
             go.place_chess(my_action[0], my_action[1], piece_type)
             go.died_pieces = go.remove_died_pieces(3 - piece_type)
             go.n_move += 1
@@ -300,22 +509,220 @@ def main(go, piece_type, n):
             my_action = 'PASS'
             go.previous_board = deepcopy(go.board)
             go.n_move += 1
-    
+
+    if deadline is not None:
+        print('Completed depth', context.depth, file=sys.stderr)
+    print('Searched', context.nodes, 'nodes with', context.cutoffs, 'cutoffs and', context.tt.hits, 'table hits', file=sys.stderr)
     return my_action
  
-if __name__ == '__main__':
-     
-    piece_type, prev_board, current_board, n = read_write.read_input('input.txt')
+def known_move(go, piece_type, tables):
+    #Move from the opening book or the endgame tablebase, or None when the position is in neither
+    for name, table in tables:
+        if table is not None:
+            my_action = table.probe(go, piece_type)
+            if my_action is not None:
+                print(name, 'move', file=sys.stderr)
+                return my_action
+    return None
+
+def play_mcts(go, piece_type, player, deadline=None, playouts=None):
+    #Move of the MCTS player, with its speed on stderr
+    my_action = player.get_input(go, piece_type, playouts, deadline)
+    rate = player.playouts / player.elapsed if player.elapsed > 0 else 0
+    print('Ran', player.playouts, 'playouts in', round(player.elapsed, 3), 'seconds,', int(rate), 'playouts/sec,', player.reused, 'visits reused', file=sys.stderr)
+    return my_action
+
+def new_go(piece_type, prev_board, current_board, n):
+    #Board set up the way the host hands it over in input.txt
     N = 5
-    go = GO(N)
-    
+    go = BitboardGO(N)
+
     go.init_board(N)
     go.previous_board = prev_board
     go.board = current_board
     go.n_move = n
     go.died_pieces = go.remove_died_pieces(3 - piece_type)
+    return go
+
+def encode_input(piece_type, prev_board, current_board):
+    #One line request: "<piece_type> <previous board> <board>", boards as rows of digits
+    return ' '.join([str(piece_type), ''.join(''.join(str(x) for x in row) for row in prev_board), ''.join(''.join(str(x) for x in row) for row in current_board)])
+
+def decode_input(line, N=5):
+    #Inverse of encode_input; returns the same tuple as read_write.read_input
+    fields = line.split()
+    if len(fields) != 3 or fields[0] not in ('1', '2') or any(len(board) != N * N or board.strip('012') for board in fields[1:]):
+        raise ValueError('bad request: ' + line.strip())
+    prev_board = [[int(x) for x in fields[1][i * N:(i + 1) * N]] for i in range(N)]
+    current_board = [[int(x) for x in fields[2][i * N:(i + 1) * N]] for i in range(N)]
+    n = sum(1 for row in current_board for x in row if x != 0)
+    return int(fields[0]), prev_board, current_board, n
+
+def format_action(action):
+    #Same text as read_write.write_output
+    if action == 'PASS':
+        return 'PASS'
+    return str(action[0]) + ',' + str(action[1])
+
+def parse_action(text):
+    text = text.strip()
+    if text == 'PASS':
+        return 'PASS'
+    i, j = text.split(',')
+    return (int(i), int(j))
+
+class Engine:
+    def __init__(self, tt_size=TT_SIZE, time_limit=TIME_LIMIT, depth=DEPTH, workers=0, player='minimax', playouts=None, book=None, tablebase=None, time_margin=TIME_MARGIN):
+        #Long running player: the search context (and the process pool, or the MCTS tree) is kept from one move of a game to the next
+        self.tt_size = tt_size
+        self.time_limit = time_limit
+        self.time_margin = time_margin
+        self.depth = depth
+        self.workers = workers
+        self.executor = ProcessPoolExecutor(workers) if workers > 0 and player == 'minimax' else None
+        self.mcts = MCTSPlayer() if player == 'mcts' else None
+        self.playouts = playouts
+        self.tables = [('Book', book), ('Tablebase', tablebase)]
+        self.context = None
+        self.piece_type = None
+
+    def new_game(self):
+        self.context = None
+        self.piece_type = None
+        if self.mcts is not None:
+            self.mcts.new_game()
+
+    def play(self, piece_type, prev_board, current_board, n):
+        deadline = None
+        if self.time_limit is not None:
+            deadline = time.time() + self.time_limit - self.time_margin
+        #A new color or an empty previous board means a new game
+        if self.context is None or piece_type != self.piece_type or not any(any(row) for row in prev_board):
+            self.new_game()
+            self.context = SearchContext(self.tt_size)
+        else:
+            self.context.new_search()
+        self.piece_type = piece_type
+        go = new_go(piece_type, prev_board, current_board, n)
+        my_action = known_move(go, piece_type, self.tables)
+        if my_action is not None:
+            return my_action
+        if self.mcts is not None:
+            return play_mcts(go, piece_type, self.mcts, deadline, self.playouts)
+        return main(go, piece_type, n, self.context, deadline, self.depth, self.executor, self.workers)
+
+    def handle(self, line):
+        #Answer one protocol line: a request from encode_input, NEW or QUIT; None means stop
+        command = line.strip()
+        if command == 'QUIT':
+            return None
+        if command == 'NEW':
+            self.new_game()
+            return 'OK'
+        try:
+            return format_action(self.play(*decode_input(command)))
+        except ValueError as error:
+            return 'ERROR ' + str(error)
+        except Exception as error:
+            #A failing request must not take down the server; the game state may be broken, so start over
+            traceback.print_exc()
+            self.new_game()
+            return 'ERROR ' + type(error).__name__ + ': ' + str(error)
+
+    def serve(self, infile, outfile):
+        #Line protocol: one request per line, one answer per line
+        for line in infile:
+            if not line.strip():
+                continue
+            answer = self.handle(line)
+            if answer is None:
+                break
+            outfile.write(answer + '\n')
+            outfile.flush()
+
+class EngineHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.server.engine.serve(io.TextIOWrapper(self.rfile), io.TextIOWrapper(self.wfile, write_through=True))
+
+def serve_socket(engine, path):
+    #Serve the line protocol on a Unix socket, one connection at a time so the engine state is shared
+    if os.path.exists(path):
+        os.unlink(path)
+    server = socketserver.UnixStreamServer(path, EngineHandler)
+    server.engine = engine
+    #Exit through the finally clause on kill so the socket file is removed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.unlink(path)
+
+def request_move(path, piece_type, prev_board, current_board, timeout=None):
+    #Ask a running server for a move; raises OSError when there is none
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(timeout)
+    try:
+        client.connect(path)
+        stream = client.makefile('rw')
+        stream.write(encode_input(piece_type, prev_board, current_board) + '\nQUIT\n')
+        stream.flush()
+        answer = stream.readline()
+    finally:
+        client.close()
+    if not answer or answer.startswith('ERROR'):
+        raise OSError('engine server failed: ' + answer.strip())
+    return parse_action(answer)
 
-    my_action = main(go, piece_type, n)
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--serve', action='store_true', help='keep running and answer positions over stdin/stdout, or over --socket')
+    parser.add_argument('--socket', help='Unix socket of the engine server; without --serve, forward input.txt to it and fall back to a local search')
+    parser.add_argument('--time-limit', type=float, default=TIME_LIMIT, help='seconds per move, searched by iterative deepening (default: fixed depth)')
+    parser.add_argument('--time-margin', type=float, default=TIME_MARGIN, help='seconds kept back from --time-limit to write the answer and exit')
+    parser.add_argument('--depth', type=int, default=DEPTH, help='search depth without a time limit')
+    parser.add_argument('--workers', type=int, default=0, help='split the root moves over this many processes (0 searches in this process)')
+    parser.add_argument('--player', choices=['minimax', 'mcts'], default='minimax', help='search used to pick the move')
+    parser.add_argument('--playouts', type=int, default=None, help='MCTS playouts per move (default: the time limit, or mcts.PLAYOUTS)')
+    parser.add_argument('--book', default=BOOK_FILE, help='opening book file, used if it exists (empty string to disable)')
+    parser.add_argument('--tablebase', default=TABLEBASE_FILE, help='endgame tablebase file, used if it exists (empty string to disable)')
+    parser.add_argument('--profile', help='record calls and time of the hot paths to this file at exit (.folded for flame graphs, else json); also set by GO_PROFILE')
+    args = parser.parse_args()
+    instrument.setup(args.profile)
+    book = load_book(args.book)
+    tablebase = load_tablebase(args.tablebase)
+
+    if args.serve:
+        engine = Engine(time_limit=args.time_limit, depth=args.depth, workers=args.workers, player=args.player, playouts=args.playouts, book=book, tablebase=tablebase, time_margin=args.time_margin)
+        if args.socket:
+            serve_socket(engine, args.socket)
+        else:
+            engine.serve(sys.stdin, sys.stdout)
+        sys.exit(0)
+     
+    piece_type, prev_board, current_board, n = read_write.read_input('input.txt')
+    my_action = None
+    if args.socket:
+        try:
+            my_action = request_move(args.socket, piece_type, prev_board, current_board)
+        except OSError as error:
+            print(error, file=sys.stderr)
+
+    if my_action is None:
+        #The time limit counts from the start of the process
+        deadline = None
+        if args.time_limit is not None:
+            deadline = START_TIME + args.time_limit - args.time_margin
+        go = new_go(piece_type, prev_board, current_board, n)
+        my_action = known_move(go, piece_type, [('Book', book), ('Tablebase', tablebase)])
+    if my_action is None:
+        if args.player == 'mcts':
+            my_action = play_mcts(go, piece_type, MCTSPlayer(), deadline, args.playouts)
+        else:
+            executor = ProcessPoolExecutor(args.workers) if args.workers > 0 else None
+            my_action = main(go, piece_type, n, deadline=deadline, depth=args.depth, executor=executor, workers=args.workers)
+            if executor is not None:
+                executor.shutdown()
  
     read_write.write_output('output.txt', my_action)
 
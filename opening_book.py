@@ -0,0 +1,202 @@
+import os
+import sys
+import mmap
+import time
+import struct
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from bitboard import BitboardGO
+from symmetry import canonical_state, map_move, unmap_move
+
+# Book layout: header, then an open-addressing hash table of fixed-size
+# records indexed by the low bits of the canonical board hash. All little endian.
+MAGIC = b'BOOK'
+VERSION = 1
+HEADER = struct.Struct('<4sIIIQ8x') # magic, version, n, number of slots, number of entries
+RECORD = struct.Struct('<QBB6x') # canonical hash, side to move (0 marks an empty slot), move i * n + j (n*n for PASS)
+
+def book_position(go, piece_type):
+    '''
+    Key of a position in the book.
+
+    Positions where the side to move just lost stones are left out, since
+    their KO state depends on more than the board.
+
+    :param go: BitboardGO instance.
+    :param piece_type: side to move.
+    :return: (canonical hash, transform index), or None if the position can't be in the book.
+    '''
+    if go.previous_stones[piece_type] & ~go.stones[piece_type]:
+        return None
+    return canonical_state(go)
+
+def save_book(entries, file_name, n=5):
+    '''
+    Write a book file.
+
+    :param entries: dict mapping (canonical hash, side to move) to the move (row, column) or "PASS", in the canonical orientation.
+    :param file_name: output file.
+    :param n: size of the board n*n
+    :return: None.
+    '''
+    # Keep the table at most half full so probes stay short
+    n_slots = 1
+    while n_slots < 2 * len(entries):
+        n_slots *= 2
+    slots = [None] * n_slots
+    mask = n_slots - 1
+    for (key, piece_type), move in sorted(entries.items()):
+        slot = key & mask
+        while slots[slot] is not None:
+            slot = (slot + 1) & mask
+        slots[slot] = (key, piece_type, n * n if move == 'PASS' else move[0] * n + move[1])
+    out = open(file_name, 'wb')
+    out.write(HEADER.pack(MAGIC, VERSION, n, n_slots, len(entries)))
+    for record in slots:
+        out.write(RECORD.pack(*(record if record is not None else (0, 0, 0))))
+    out.close()
+
+class OpeningBook:
+    def __init__(self, file_name):
+        '''
+        Opening book opened with mmap; a probe hashes the board once and reads one or two records.
+
+        :param file_name: file written by save_book.
+        '''
+        book_file = open(file_name, 'rb')
+        self.data = mmap.mmap(book_file.fileno(), 0, access=mmap.ACCESS_READ)
+        book_file.close()
+        magic, version, n, n_slots, count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('{} is not a version {} opening book'.format(file_name, VERSION))
+        self.n = n
+        self.mask = n_slots - 1
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def lookup(self, key, piece_type):
+        '''
+        :param key: canonical hash.
+        :param piece_type: side to move.
+        :return: move in the canonical orientation, or None if the position is not in the book.
+        '''
+        slot = key & self.mask
+        while True:
+            record_key, side, move = RECORD.unpack_from(self.data, HEADER.size + slot * RECORD.size)
+            if side == 0:
+                return None
+            if record_key == key and side == piece_type:
+                if move == self.n * self.n:
+                    return 'PASS'
+                return (move // self.n, move % self.n)
+            slot = (slot + 1) & self.mask
+
+    def probe(self, go, piece_type):
+        '''
+        Look up the book move of a position.
+
+        :param go: BitboardGO instance.
+        :param piece_type: side to move.
+        :return: (row, column) or "PASS" on the real board, or None if the position is not in the book.
+        '''
+        if go.size != self.n:
+            return None
+        position = book_position(go, piece_type)
+        if position is None:
+            return None
+        key, transform = position
+        move = self.lookup(key, piece_type)
+        if move is None or move == 'PASS':
+            return move
+        move = unmap_move(move, transform, self.n)
+        if not go.valid_place_check(move[0], move[1], piece_type):
+            return None
+        return move
+
+def load_book(file_name):
+    '''
+    Open a book file if there is one.
+
+    :param file_name: book file.
+    :return: OpeningBook instance, or None if the file does not exist.
+    '''
+    if not file_name or not os.path.exists(file_name):
+        return None
+    return OpeningBook(file_name)
+
+def build_book(plies, search, n=5, verbose=False):
+    '''
+    Build book entries for both colors.
+
+    For each color, every position in the first plies moves where it is to
+    move gets the move found by search; the tree then follows that move and
+    every reply of the opponent. Positions are merged under the 8 board
+    symmetries.
+
+    :param plies: number of moves from the empty board covered by the book.
+    :param search: function (go, piece_type) -> move, the deep search.
+    :param n: size of the board n*n
+    :param verbose: print progress to stderr.
+    :return: dict mapping (canonical hash, side to move) to the move in the canonical orientation.
+    '''
+    entries = dict()
+    for my_piece_type in (1, 2):
+        go = BitboardGO(n)
+        go.init_board(n)
+        frontier = [(go, 1)]
+        for ply in range(plies):
+            next_frontier = dict()
+            for go, piece_type in frontier:
+                if piece_type == my_piece_type:
+                    key, transform = book_position(go, piece_type)
+                    if (key, piece_type) not in entries:
+                        move = search(go.copy_board(), piece_type)
+                        entries[(key, piece_type)] = move if move == 'PASS' else map_move(move, transform, n)
+                    move = entries[(key, piece_type)]
+                    moves = [move if move == 'PASS' else unmap_move(move, transform, n)]
+                else:
+                    moves = go.positions(go.legal_moves_mask(piece_type))
+                for move in moves:
+                    child = go.copy_board()
+                    child.undo_stack = []
+                    child.make_move(move, piece_type)
+                    if child.game_end(3 - piece_type):
+                        continue
+                    position = book_position(child, 3 - piece_type)
+                    if position is not None and position[0] not in next_frontier:
+                        next_frontier[position[0]] = (child, 3 - piece_type)
+            frontier = list(next_frontier.values())
+            if verbose:
+                print('Color', my_piece_type, 'ply', ply + 1, len(entries), 'entries,', len(frontier), 'positions next', file=sys.stderr)
+    return entries
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the opening book of my_player3 with deep searches.')
+    parser.add_argument('--output', default='opening_book.bin', help='book file to write')
+    parser.add_argument('--plies', type=int, default=4, help='moves from the empty board covered by the book')
+    parser.add_argument('--depth', type=int, default=6, help='search depth of every book move')
+    parser.add_argument('--workers', type=int, default=0, help='split the root moves over this many processes')
+    args = parser.parse_args()
+
+    #my_player3 imports this module to probe the book
+    import my_player3
+    executor = ProcessPoolExecutor(args.workers) if args.workers > 0 else None
+
+    def search(go, piece_type):
+        possible_moves = my_player3.return_valid_moves(go, piece_type)
+        if possible_moves == 'PASS':
+            return 'PASS'
+        return my_player3.choose_move(possible_moves, go, piece_type, my_player3.SearchContext(), None, args.depth, executor, args.workers)
+
+    start = time.time()
+    entries = build_book(args.plies, search, verbose=True)
+    save_book(entries, args.output)
+    if executor is not None:
+        executor.shutdown()
+    print('Wrote', len(entries), 'positions to', args.output, 'in', round(time.time() - start, 1), 'seconds')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,417 @@
+import json
+import struct
+import argparse
+
+import numpy as np
+
+from zobrist import load_q_table
+
+# Binary layout: header, sorted uint64 state hashes, float32 values (one row
+# per state, same order), float32 row maxima, uint32 visit counts. All little
+# endian. Version 1 files have no visit counts.
+MAGIC = b'QTAB'
+VERSION = 2
+VISITS_MAX = 0xFFFFFFFF # Visit count of states from version 1 files, never pruned
+HEADER = struct.Struct('<4sIIIQ8x') # magic, version, n, n_actions, number of states
+
+class QTable:
+    def __init__(self, n=5, capacity=1 << 16):
+        '''
+        Q-table backed by preallocated NumPy arrays.
+
+        Every state hash gets a row of n*n + 1 float32 action values, one per
+        point (i * n + j) and the last one for PASS. Illegal actions hold -inf,
+        which doubles as the legal-action mask, and the max of every row is
+        cached. Every state also counts the training games that played from
+        it, for prune(). A state costs about 4 * (n*n + 3) + 8 bytes plus its
+        index entry.
+
+        :param n: size of the board n*n
+        :param capacity: number of rows allocated up front, doubled when full.
+        '''
+        self.n = n
+        self.n_actions = n * n + 1
+        self.pass_action = n * n
+        self.rows = dict() # state hash -> row
+        self.keys = np.zeros(capacity, dtype=np.uint64) # row -> state hash
+        self.values = np.full((capacity, self.n_actions), -np.inf, dtype=np.float32)
+        self.row_max = np.full(capacity, -np.inf, dtype=np.float32)
+        self.visits = np.zeros(capacity, dtype=np.uint32)
+        self.dirty = set() # rows changed since the last checkpoint
+        self.pruned = False # rows removed since the last checkpoint
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, state):
+        return state in self.rows
+
+    def action(self, move):
+        '''
+        :param move: (row, column).
+        :return: action index of the move.
+        '''
+        return move[0] * self.n + move[1]
+
+    def move(self, action):
+        '''
+        :param action: action index, not PASS.
+        :return: (row, column) of the action.
+        '''
+        return (action // self.n, action % self.n)
+
+    def row(self, state):
+        '''
+        :param state: state hash.
+        :return: row of the state, or None if it has never been added.
+        '''
+        return self.rows.get(state)
+
+    def add(self, state, actions):
+        '''
+        Add a state with all its legal actions valued 0.
+
+        :param state: state hash.
+        :param actions: list of legal action indices.
+        :return: row of the new state.
+        '''
+        row = len(self.rows)
+        if row == len(self.values):
+            self.grow()
+        self.rows[state] = row
+        self.keys[row] = state
+        self.values[row] = -np.inf
+        self.values[row, actions] = 0
+        self.row_max[row] = 0
+        self.visits[row] = 0
+        self.dirty.add(row)
+        return row
+
+    def grow(self):
+        capacity = len(self.values)
+        keys = np.zeros(2 * capacity, dtype=np.uint64)
+        keys[:capacity] = self.keys
+        values = np.full((2 * capacity, self.n_actions), -np.inf, dtype=np.float32)
+        values[:capacity] = self.values
+        row_max = np.full(2 * capacity, -np.inf, dtype=np.float32)
+        row_max[:capacity] = self.row_max
+        visits = np.zeros(2 * capacity, dtype=np.uint32)
+        visits[:capacity] = self.visits
+        self.keys = keys
+        self.values = values
+        self.row_max = row_max
+        self.visits = visits
+
+    def visit(self, row):
+        # One more training game played from this state
+        if self.visits[row] < VISITS_MAX:
+            self.visits[row] += 1
+            self.dirty.add(row)
+
+    def get(self, row, action):
+        return float(self.values[row, action])
+
+    def update(self, row, action, value):
+        '''
+        Set the value of an action, keeping the row max up to date.
+
+        :param row: row of the state.
+        :param action: legal action index.
+        :param value: new q-value.
+        :return: None.
+        '''
+        values = self.values
+        old = values[row, action]
+        values[row, action] = value
+        self.dirty.add(row)
+        value = values[row, action] # rounded to float32
+        if value >= self.row_max[row]:
+            self.row_max[row] = value
+        elif old == self.row_max[row]:
+            self.row_max[row] = values[row].max()
+
+    def update_batch(self, rows, actions, values):
+        '''
+        Set the values of many actions at once, then recompute the maxima of their rows.
+
+        :param rows: array of rows.
+        :param actions: array of legal action indices, one per row.
+        :param values: array of new q-values; the last one wins if a (row, action) repeats.
+        :return: None.
+        '''
+        self.values[rows, actions] = values
+        touched = np.unique(rows)
+        self.row_max[touched] = self.values[touched].max(axis=1)
+        self.dirty.update(touched.tolist())
+
+    def set_row(self, state, values):
+        '''
+        Set all the action values of a state, adding it if needed.
+
+        :param state: state hash.
+        :param values: n*n + 1 values, -inf for illegal actions.
+        :return: row of the state.
+        '''
+        row = self.rows.get(state)
+        if row is None:
+            row = self.add(state, [])
+        self.values[row] = values
+        self.row_max[row] = self.values[row].max()
+        self.dirty.add(row)
+        return row
+
+    def copy(self):
+        '''
+        :return: a copy of the table, sharing nothing with it.
+        '''
+        count = len(self.rows)
+        table = QTable(self.n, max(1, count))
+        table.keys[:count] = self.keys[:count]
+        table.values[:count] = self.values[:count]
+        table.row_max[:count] = self.row_max[:count]
+        table.visits[:count] = self.visits[:count]
+        table.rows = dict(self.rows)
+        return table
+
+    def prune(self, min_visits, min_spread=None, max_states=None):
+        '''
+        Remove the states visited less than min_visits times, and compact the rest.
+
+        :param min_visits: states visited at least this many times are kept.
+        :param min_spread: if given, rarely visited states are kept anyway when
+            their best and worst legal values differ by at least this much.
+        :param max_states: if given and more states are left, only this many are
+            kept: the most visited, then those with the larger spread, then the oldest.
+        :return: number of states removed.
+        '''
+        count = len(self.rows)
+        visits = self.visits[:count]
+        values = self.values[:count]
+        spread = self.row_max[:count] - np.where(values > -np.inf, values, np.inf).min(axis=1)
+        keep = visits >= min_visits
+        if min_spread is not None:
+            keep |= spread >= min_spread
+        kept = np.flatnonzero(keep)
+        if max_states is not None and len(kept) > max_states:
+            # The most visited first, ties broken by the larger spread, then the older row
+            order = np.lexsort((kept, -spread[kept], -visits[kept].astype(np.int64)))
+            kept = np.sort(kept[order[:max_states]])
+        if len(kept) == count:
+            return 0
+        # Rows keep their order, so states added later still come last
+        self.keys[:len(kept)] = self.keys[kept]
+        self.values[:len(kept)] = self.values[kept]
+        self.row_max[:len(kept)] = self.row_max[kept]
+        self.visits[:len(kept)] = self.visits[kept]
+        self.values[len(kept):count] = -np.inf
+        self.row_max[len(kept):count] = -np.inf
+        self.rows = dict(zip(self.keys[:len(kept)].tolist(), range(len(kept))))
+        self.dirty = set()
+        self.pruned = True
+        return count - len(kept)
+
+    def max_value(self, row):
+        return float(self.row_max[row])
+
+    def argmax(self, row):
+        '''
+        :param row: row of the state.
+        :return: the first legal action with the highest value.
+        '''
+        return int(np.argmax(self.values[row]))
+
+    def legal_mask(self, row):
+        return self.values[row] > -np.inf
+
+    def legal_actions(self, row):
+        return np.flatnonzero(self.legal_mask(row)).tolist()
+
+    @classmethod
+    def from_dict(cls, q_table, n=5):
+        '''
+        Build a QTable from the json layout {state hash: {"(i, j)": q-value}}.
+
+        :param q_table: dict as returned by zobrist.load_q_table.
+        :param n: size of the board n*n
+        :return: QTable instance.
+        '''
+        table = cls(n, max(1, len(q_table)))
+        indices = dict() # "(i, j)" -> action index, parsed once per key
+        for state, actions in q_table.items():
+            for key in actions:
+                if key not in indices:
+                    indices[key] = table.action(tuple(int(x) for x in key.strip('()').split(',')))
+            legal = [indices[key] for key in actions]
+            row = table.add(state, legal)
+            if legal:
+                # One assignment per row, the row max set once
+                table.values[row, legal] = list(actions.values())
+                table.row_max[row] = table.values[row].max()
+        # json files have no visit counts
+        table.visits[:len(q_table)] = VISITS_MAX
+        return table
+
+    def to_dict(self):
+        '''
+        Export the table in the json layout {state hash: {"(i, j)": q-value}}.
+
+        :return: dict of dicts.
+        '''
+        names = [str(self.move(action)) for action in range(self.n_actions)]
+        q_table = dict()
+        for state, row in self.rows.items():
+            values = self.values[row]
+            actions = np.flatnonzero(values > -np.inf)
+            q_table[state] = dict(zip([names[action] for action in actions.tolist()], values[actions].tolist()))
+        return q_table
+
+class MappedQTable(QTable):
+    def __init__(self, file_name):
+        '''
+        Read-only Q-table opened straight from a binary file with mmap.
+
+        Nothing is parsed up front: a state is found by binary search over the
+        sorted hashes, and only the pages touched are read from disk. The
+        whole-table operations (copy, to_dict, save_binary) read every state.
+
+        :param file_name: file written by save_binary.
+        '''
+        header = open(file_name, 'rb')
+        magic, version, n, n_actions, count = HEADER.unpack(header.read(HEADER.size))
+        header.close()
+        if magic != MAGIC or version not in (1, VERSION):
+            raise ValueError('{} is not a version 1 or {} Q-table file'.format(file_name, VERSION))
+        self.n = n
+        self.n_actions = n_actions
+        self.pass_action = n * n
+        self.count = count
+        offset = HEADER.size
+        if count == 0:
+            self.keys = np.zeros(0, dtype='<u8')
+            self.values = np.zeros((0, n_actions), dtype='<f4')
+            self.row_max = np.zeros(0, dtype='<f4')
+            self.visits = np.zeros(0, dtype='<u4')
+            return
+        self.keys = np.memmap(file_name, dtype='<u8', mode='r', offset=offset, shape=(count,))
+        offset += 8 * count
+        self.values = np.memmap(file_name, dtype='<f4', mode='r', offset=offset, shape=(count, n_actions))
+        offset += 4 * count * n_actions
+        self.row_max = np.memmap(file_name, dtype='<f4', mode='r', offset=offset, shape=(count,))
+        offset += 4 * count
+        if version == 1:
+            self.visits = np.full(count, VISITS_MAX, dtype='<u4')
+        else:
+            self.visits = np.memmap(file_name, dtype='<u4', mode='r', offset=offset, shape=(count,))
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, state):
+        return self.row(state) is not None
+
+    @property
+    def rows(self):
+        # state hash -> row, only built for the operations that go through every state
+        return dict(zip(self.keys.tolist(), range(self.count)))
+
+    def row(self, state):
+        row = int(np.searchsorted(self.keys, np.uint64(state)))
+        if row < self.count and int(self.keys[row]) == state:
+            return row
+        return None
+
+    def add(self, state, actions):
+        raise TypeError('MappedQTable is read-only')
+
+    def update(self, row, action, value):
+        raise TypeError('MappedQTable is read-only')
+
+    def update_batch(self, rows, actions, values):
+        raise TypeError('MappedQTable is read-only')
+
+    def visit(self, row):
+        raise TypeError('MappedQTable is read-only')
+
+    def set_row(self, state, values):
+        raise TypeError('MappedQTable is read-only')
+
+    def prune(self, min_visits, min_spread=None, max_states=None):
+        raise TypeError('MappedQTable is read-only, prune a copy()')
+
+def save_binary(table, file_name):
+    '''
+    Write a Q-table in the binary format read by MappedQTable and load_binary.
+
+    :param table: QTable instance.
+    :param file_name: output file.
+    :return: None.
+    '''
+    count = len(table)
+    keys = np.fromiter(table.rows.keys(), dtype=np.uint64, count=count)
+    rows = np.fromiter(table.rows.values(), dtype=np.int64, count=count)
+    order = np.argsort(keys)
+    rows = rows[order]
+    out = open(file_name, 'wb')
+    out.write(HEADER.pack(MAGIC, VERSION, table.n, table.n_actions, count))
+    keys[order].astype('<u8').tofile(out)
+    table.values[rows].astype('<f4').tofile(out)
+    table.row_max[rows].astype('<f4').tofile(out)
+    table.visits[rows].astype('<u4').tofile(out)
+    out.close()
+
+def load_binary(file_name):
+    '''
+    Load a binary Q-table file into a writable QTable.
+
+    :param file_name: file written by save_binary.
+    :return: QTable instance.
+    '''
+    mapped = MappedQTable(file_name)
+    table = QTable(mapped.n, max(1, len(mapped)))
+    count = len(mapped)
+    table.keys[:count] = mapped.keys
+    table.values[:count] = mapped.values
+    table.row_max[:count] = mapped.row_max
+    table.visits[:count] = mapped.visits
+    table.rows = dict(zip(mapped.keys.tolist(), range(count)))
+    return table
+
+def load_table(file_name, n=5):
+    '''
+    Load a Q-table from a binary (.qtb) or json file.
+
+    :param file_name: q_table_black.json, q_table_black.qtb, ...
+    :param n: size of the board n*n
+    :return: QTable instance.
+    '''
+    if file_name.endswith('.qtb'):
+        return load_binary(file_name)
+    return QTable.from_dict(load_q_table(file_name), n)
+
+def save_table(table, file_name):
+    '''
+    Save a Q-table to a binary (.qtb) or json file.
+
+    :param table: QTable instance.
+    :param file_name: q_table_black.json, q_table_black.qtb, ...
+    :return: None.
+    '''
+    if file_name.endswith('.qtb'):
+        save_binary(table, file_name)
+    else:
+        out = open(file_name, 'w')
+        json.dump(table.to_dict(), out)
+        out.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert Q-table files between json and the binary .qtb format.')
+    parser.add_argument('source', help='Q-table file to read (.json or .qtb)')
+    parser.add_argument('target', help='Q-table file to write (.json or .qtb)')
+    args = parser.parse_args()
+
+    table = load_table(args.source)
+    save_table(table, args.target)
+    print('Converted', len(table), 'states')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+import numpy as np
+
+class ReplayBuffer:
+    def __init__(self, capacity, batch_size=256, ratio=4.0, rng=None):
+        '''
+        Ring buffer of Q-learning transitions, replayed in vectorized batches.
+
+        Transitions are kept as rows of the Q-table, so a batch update is a
+        gather of the next-state maxima and a scatter of the new values. A
+        next state the table did not have yet is looked up again when it is
+        sampled. Rows change when a table is pruned or evicted, so the buffer
+        only works with a plain QTable that is not pruned.
+
+        :param capacity: transitions kept, the oldest are overwritten.
+        :param batch_size: transitions per batch update.
+        :param ratio: sampled updates per transition added.
+        :param rng: numpy Generator or seed.
+        '''
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.ratio = ratio
+        self.rng = np.random.default_rng(rng)
+        self.rows = np.zeros(capacity, dtype=np.int64)
+        self.actions = np.zeros(capacity, dtype=np.int64)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.next_states = np.zeros(capacity, dtype=np.uint64)
+        self.next_rows = np.full(capacity, -1, dtype=np.int64) # -1 while the next state is not in the table
+        self.size = 0
+        self.position = 0 # where the next transition goes
+        self.owed = 0.0 # updates earned by the transitions added and not applied yet
+        self.updates = 0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, q_table, transitions):
+        '''
+        Store transitions.
+
+        :param q_table: QTable the states are in.
+        :param transitions: list of (state, action, reward, next_state) as collected by train().
+        :return: None.
+        '''
+        for state, action, reward, next_state in transitions:
+            next_row = q_table.row(next_state)
+            i = self.position
+            self.rows[i] = q_table.row(state)
+            self.actions[i] = action
+            self.rewards[i] = reward
+            self.next_states[i] = next_state
+            self.next_rows[i] = -1 if next_row is None else next_row
+            self.position = (i + 1) % self.capacity
+            self.size = min(self.size + 1, self.capacity)
+        self.owed += self.ratio * len(transitions)
+
+    def sample(self, q_table, count):
+        '''
+        Draw transitions uniformly.
+
+        :param q_table: QTable, to look up next states that were unknown.
+        :param count: number of transitions.
+        :return: (rows, actions, rewards, next rows), next rows -1 for states still unknown.
+        '''
+        i = self.rng.integers(0, self.size, count)
+        next_rows = self.next_rows[i]
+        for k in np.flatnonzero(next_rows < 0).tolist():
+            next_row = q_table.row(int(self.next_states[i[k]]))
+            if next_row is not None:
+                next_rows[k] = self.next_rows[i[k]] = next_row
+        return self.rows[i], self.actions[i], self.rewards[i], next_rows
+
+    def learn(self, q_table, alpha, gamma):
+        '''
+        Apply the batch updates earned by the transitions added so far.
+
+        :param q_table: QTable.
+        :param alpha: learning rate.
+        :param gamma: discount factor.
+        :return: number of transitions updated.
+        '''
+        done = 0
+        while self.size > 0 and self.owed >= self.batch_size:
+            rows, actions, rewards, next_rows = self.sample(q_table, self.batch_size)
+            # Unknown next states are worth 0, like in q_update
+            q_max_next = np.where(next_rows >= 0, q_table.row_max[np.maximum(next_rows, 0)], 0)
+            targets = (1 - alpha) * q_table.values[rows, actions] + alpha * (rewards + gamma * q_max_next)
+            q_table.update_batch(rows, actions, targets)
+            self.owed -= self.batch_size
+            done += self.batch_size
+        self.updates += done
+        return done
@@ -0,0 +1,117 @@
+from zobrist import zobrist_keys
+
+_TABLES = {}
+
+def transforms(n):
+    '''
+    List the 8 rotations/reflections of an n*n board as point permutations.
+
+    :param n: width and height of the board.
+    :return: perms[k][i * n + j], the point (i, j) is sent to under transform k. Transform 0 is the identity.
+    '''
+    perms = []
+    for k in range(8):
+        perm = []
+        for i in range(n):
+            for j in range(n):
+                r, c = i, j
+                for _ in range(k % 4): # rotate by 90 degrees
+                    r, c = c, n - 1 - r
+                if k >= 4: # then mirror
+                    c = n - 1 - c
+                perm.append(r * n + c)
+        perms.append(perm)
+    return perms
+
+def symmetry_tables(n):
+    '''
+    Build (and cache) the tables used to hash all 8 orientations of a board.
+
+    Each row of each bitset is looked up at once, so a board hashes in 2 * n
+    lookups per orientation. The tables grow as 2^n, which suits the small
+    boards this game is played on.
+
+    :param n: width and height of the board.
+    :return: tuple (perms, inverse perms, row_keys[k][piece_type][i][row bits]).
+    '''
+    if n not in _TABLES:
+        keys = zobrist_keys(n)
+        perms = transforms(n)
+        inverses = []
+        for perm in perms:
+            inverse = [0] * (n * n)
+            for p, q in enumerate(perm):
+                inverse[q] = p
+            inverses.append(inverse)
+        row_keys = []
+        for perm in perms:
+            by_type = [None]
+            for piece_type in (1, 2):
+                rows = []
+                for i in range(n):
+                    table = [0] * (1 << n)
+                    for row_bits in range(1, 1 << n):
+                        low = row_bits & -row_bits
+                        j = low.bit_length() - 1
+                        table[row_bits] = table[row_bits ^ low] ^ keys[piece_type][perm[i * n + j]]
+                    rows.append(table)
+                by_type.append(rows)
+            row_keys.append(by_type)
+        _TABLES[n] = (perms, inverses, row_keys)
+    return _TABLES[n]
+
+def canonical_state(go):
+    '''
+    Find the canonical orientation of the board under the dihedral group.
+
+    The canonical key is the smallest Zobrist hash among the 8 orientations,
+    so every orientation of a board gets the same key.
+
+    :param go: GO or BitboardGO instance.
+    :return: tuple (canonical hash, index of the transform that maps the board to it).
+    '''
+    n = go.size
+    perms, inverses, row_keys = symmetry_tables(n)
+    stones = go.stones
+    row_mask = (1 << n) - 1
+    rows = [((stones[1] >> (i * n)) & row_mask, (stones[2] >> (i * n)) & row_mask) for i in range(n)]
+    best = None
+    best_k = 0
+    for k in range(8):
+        black_keys = row_keys[k][1]
+        white_keys = row_keys[k][2]
+        h = 0
+        for i in range(n):
+            h ^= black_keys[i][rows[i][0]] ^ white_keys[i][rows[i][1]]
+        if best is None or h < best:
+            best = h
+            best_k = k
+    return best, best_k
+
+def map_move(move, k, n):
+    '''
+    Send a move from the real board to the orientation given by transform k.
+
+    :param move: (row, column).
+    :param k: transform index from canonical_state.
+    :param n: width and height of the board.
+    :return: (row, column) in the transformed board.
+    '''
+    if k == 0:
+        return move
+    q = symmetry_tables(n)[0][k][move[0] * n + move[1]]
+    return (q // n, q % n)
+
+def unmap_move(move, k, n):
+    '''
+    Send a move from the orientation given by transform k back to the real board.
+
+    :param move: (row, column) in the transformed board.
+    :param k: transform index from canonical_state.
+    :param n: width and height of the board.
+    :return: (row, column) in the real board.
+    '''
+    if k == 0:
+        return move
+    p = symmetry_tables(n)[1][k][move[0] * n + move[1]]
+    return (p // n, p % n)
@@ -0,0 +1,246 @@
+import os
+import sys
+import mmap
+import time
+import random
+import struct
+import argparse
+
+from bitboard import BitboardGO, mask_positions
+from zobrist import zobrist_keys
+
+# Tablebase layout: header, then an open-addressing hash table of fixed-size
+# records indexed by the low bits of the position key. All little endian.
+MAGIC = b'TBAS'
+VERSION = 1
+HEADER = struct.Struct('<4sIIIQ8x') # magic, version, n, number of slots, number of entries
+RECORD = struct.Struct('<QBBbB4x') # position key, side to move (0 marks an empty slot), moves remaining, final black - white stones, move i * n + j (n*n for PASS)
+
+_MIX = random.Random(4242) # Keys mixed into the board hash; fixed so saved tablebases stay valid
+SIDE_KEYS = [0, _MIX.getrandbits(64), _MIX.getrandbits(64)]
+REMAINING_KEYS = [_MIX.getrandbits(64) for remaining in range(256)]
+PASSED_KEY = _MIX.getrandbits(64)
+
+def previous_hash(go):
+    # Zobrist hash of the previous board
+    keys = zobrist_keys(go.size)
+    h = 0
+    for piece_type in (1, 2):
+        for p in go.points(go.previous_stones[piece_type]):
+            h ^= keys[piece_type][p]
+    return h
+
+def position_key(go, piece_type):
+    '''
+    Key of a position: board, side to move, moves remaining and what the previous board changes.
+
+    The previous board matters in two cases: it equals the board (the last
+    move was a pass, so passing again ends the game), or the last move
+    captured (KO rule). Otherwise positions with the same board share a key.
+    Captures are read from the two boards rather than died_pieces, which is
+    empty for a position set up from the host's input.
+
+    :param go: BitboardGO instance.
+    :param piece_type: side to move.
+    :return: (64-bit key, moves remaining).
+    '''
+    remaining = max(0, go.max_move - go.n_move)
+    key = go.zobrist ^ SIDE_KEYS[piece_type] ^ REMAINING_KEYS[remaining]
+    if go.previous_stones == go.stones:
+        key ^= PASSED_KEY
+    elif go.previous_stones[piece_type] & ~go.stones[piece_type]:
+        key ^= (previous_hash(go) * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+    return key, remaining
+
+def stone_difference(go):
+    return go.score(1) - go.score(2)
+
+class Solver:
+    def __init__(self, n=5):
+        '''
+        Exact solver of the last moves of a game, memoized by position key.
+
+        The game ends at max_move or when a player passes right after a pass,
+        and is scored like judge_winner: black wins with more stones than
+        white plus komi. Black maximizes and white minimizes the final
+        black - white stone count, which also decides the winner.
+
+        :param n: size of the board n*n
+        '''
+        self.n = n
+        self.table = dict() # (key, side to move, remaining) -> (final black - white stones, best move)
+        self.nodes = 0
+
+    def solve(self, go, piece_type):
+        '''
+        Solve a position.
+
+        :param go: BitboardGO instance; moves are made and taken back.
+        :param piece_type: side to move.
+        :return: final black - white stones with best play.
+        '''
+        self.nodes += 1
+        key, remaining = position_key(go, piece_type)
+        if remaining == 0:
+            return stone_difference(go)
+        entry = self.table.get((key, piece_type, remaining))
+        if entry is not None:
+            return entry[0]
+
+        passed = go.previous_stones == go.stones
+        best_value = None
+        best_move = None
+        for move in mask_positions(go.legal_moves_mask(piece_type), go.size) + ['PASS']:
+            if move == 'PASS' and passed:
+                value = stone_difference(go) # Two passes in a row end the game
+            else:
+                go.make_move(move, piece_type)
+                value = self.solve(go, 3 - piece_type)
+                go.unmake_move()
+            if best_value is None or (value > best_value if piece_type == 1 else value < best_value):
+                best_value = value
+                best_move = move
+        self.table[(key, piece_type, remaining)] = (best_value, best_move)
+        return best_value
+
+def save_tablebase(table, file_name, n=5):
+    '''
+    Write a tablebase file.
+
+    :param table: Solver.table.
+    :param file_name: output file.
+    :param n: size of the board n*n
+    :return: None.
+    '''
+    # Keep the table at most half full so probes stay short
+    n_slots = 1
+    while n_slots < 2 * len(table):
+        n_slots *= 2
+    slots = [None] * n_slots
+    mask = n_slots - 1
+    for (key, piece_type, remaining), (value, move) in sorted(table.items()):
+        slot = key & mask
+        while slots[slot] is not None:
+            slot = (slot + 1) & mask
+        slots[slot] = (key, piece_type, remaining, value, n * n if move == 'PASS' else move[0] * n + move[1])
+    out = open(file_name, 'wb')
+    out.write(HEADER.pack(MAGIC, VERSION, n, n_slots, len(table)))
+    for record in slots:
+        out.write(RECORD.pack(*(record if record is not None else (0, 0, 0, 0, 0))))
+    out.close()
+
+class Tablebase:
+    def __init__(self, file_name):
+        '''
+        Endgame tablebase opened with mmap; a probe reads one or two records.
+
+        :param file_name: file written by save_tablebase.
+        '''
+        tb_file = open(file_name, 'rb')
+        self.data = mmap.mmap(tb_file.fileno(), 0, access=mmap.ACCESS_READ)
+        tb_file.close()
+        magic, version, n, n_slots, count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('{} is not a version {} tablebase'.format(file_name, VERSION))
+        self.n = n
+        self.mask = n_slots - 1
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def lookup(self, go, piece_type):
+        '''
+        :param go: BitboardGO instance.
+        :param piece_type: side to move.
+        :return: (final black - white stones, move) with best play, or None if the position is not in the tablebase.
+        '''
+        if go.size != self.n:
+            return None
+        key, remaining = position_key(go, piece_type)
+        slot = key & self.mask
+        while True:
+            record_key, side, record_remaining, value, move = RECORD.unpack_from(self.data, HEADER.size + slot * RECORD.size)
+            if side == 0:
+                return None
+            if record_key == key and side == piece_type and record_remaining == remaining:
+                if move == self.n * self.n:
+                    return value, 'PASS'
+                return value, (move // self.n, move % self.n)
+            slot = (slot + 1) & self.mask
+
+    def probe(self, go, piece_type):
+        '''
+        :param go: BitboardGO instance.
+        :param piece_type: side to move.
+        :return: the best move, or None if the position is not in the tablebase.
+        '''
+        entry = self.lookup(go, piece_type)
+        if entry is None:
+            return None
+        return entry[1]
+
+def load_tablebase(file_name):
+    '''
+    Open a tablebase file if there is one.
+
+    :param file_name: tablebase file.
+    :return: Tablebase instance, or None if the file does not exist.
+    '''
+    if not file_name or not os.path.exists(file_name):
+        return None
+    return Tablebase(file_name)
+
+def build_tablebase(games, moves, seed=None, n=5, verbose=False):
+    '''
+    Solve the positions within the last moves moves of random games, and everything below them.
+
+    my_player3 sets n_move to the number of stones on the board it is given,
+    so the sampled positions are solved with that move count too.
+
+    :param games: number of random games to sample positions from.
+    :param moves: solve positions with at most this many moves remaining.
+    :param seed: seed of the random games.
+    :param n: size of the board n*n
+    :param verbose: print progress to stderr.
+    :return: Solver with the solved positions in its table.
+    '''
+    rng = random.Random(seed)
+    solver = Solver(n)
+    for game in range(games):
+        go = BitboardGO(n)
+        go.init_board(n)
+        piece_type = 1
+        passed = False
+        while not go.game_end(piece_type):
+            position = go.copy_board()
+            position.undo_stack = []
+            position.n_move = go.score(1) + go.score(2)
+            if position.max_move - position.n_move <= moves:
+                solver.solve(position, piece_type)
+            placements = mask_positions(go.legal_moves_mask(piece_type), n)
+            move = rng.choice(placements) if placements else 'PASS'
+            if move == 'PASS' and passed:
+                break
+            go.make_move(move, piece_type)
+            passed = move == 'PASS'
+            piece_type = 3 - piece_type
+        if verbose and (game + 1) % 100 == 0:
+            print('Game', game + 1, len(solver.table), 'positions', solver.nodes, 'nodes', file=sys.stderr)
+    return solver
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the endgame tablebase of my_player3 by exact search of the last moves.')
+    parser.add_argument('--output', default='tablebase.bin', help='tablebase file to write')
+    parser.add_argument('--moves', type=int, default=4, help='solve positions with at most this many moves remaining')
+    parser.add_argument('--games', type=int, default=1000, help='random games to sample positions from')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random games')
+    args = parser.parse_args()
+
+    start = time.time()
+    solver = build_tablebase(args.games, args.moves, args.seed, verbose=True)
+    save_tablebase(solver.table, args.output)
+    print('Wrote', len(solver.table), 'positions to', args.output, 'in', round(time.time() - start, 1), 'seconds')
+
+if __name__ == '__main__':
+    main()
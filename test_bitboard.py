@@ -0,0 +1,107 @@
+import random
+from copy import deepcopy
+
+import numpy as np
+
+from Q_Learning import GO
+from bitboard import BitboardGO, mask_positions
+from batch_go import BatchGo
+from zobrist import hash_board
+
+def new_bitboard(board=None):
+    go = BitboardGO(5)
+    go.init_board(5)
+    if board is not None:
+        go.board = board
+        go.previous_board = board
+    return go
+
+def saved_state(go):
+    return (list(go.stones), list(go.previous_stones), list(go.chains), go.zobrist, go.n_move, list(go.died_pieces))
+
+def test_random_games_match_list_go():
+    rng = random.Random(5)
+    for game in range(40):
+        go = GO(5)
+        go.init_board(5)
+        bitboard = new_bitboard()
+        piece_type = 1
+        for _ in range(go.max_move):
+            mask = bitboard.legal_moves_mask(piece_type)
+            assert mask == go.legal_moves_mask(piece_type)
+            placements = mask_positions(mask, 5)
+            move = rng.choice(placements) if placements and rng.random() > 0.05 else 'PASS'
+
+            before = saved_state(bitboard)
+            bitboard.make_move(move, piece_type)
+            bitboard.unmake_move()
+            assert saved_state(bitboard) == before
+
+            bitboard.make_move(move, piece_type)
+            if move == 'PASS':
+                go.previous_board = deepcopy(go.board)
+            else:
+                go.place_chess(move[0], move[1], piece_type)
+                go.died_pieces = go.remove_died_pieces(3 - piece_type)
+            go.n_move += 1
+            assert bitboard.board == go.board
+            assert bitboard.previous_board == go.previous_board
+            assert sorted(bitboard.died_pieces) == sorted(go.died_pieces)
+            assert bitboard.zobrist == hash_board(go.board)
+            piece_type = 3 - piece_type
+        # Unwinding the whole game gets back to the empty board
+        while bitboard.undo_stack:
+            bitboard.unmake_move()
+        assert bitboard.stones == [0, 0, 0]
+        assert bitboard.zobrist == hash_board([[0] * 5 for _ in range(5)])
+
+def test_capture_and_ko():
+    board = [[0, 1, 2, 0, 0],
+             [1, 2, 0, 2, 0],
+             [0, 1, 2, 0, 0],
+             [0, 0, 0, 0, 0],
+             [0, 0, 0, 0, 0]]
+    go = new_bitboard(board)
+    assert go.legal_moves_mask(1) & go.bit(1, 2)
+    go.make_move((1, 2), 1)
+    assert go.died_pieces == [(1, 1)]
+    assert go.board[1] == [1, 0, 1, 2, 0]
+    assert go.score(2) == 3
+    assert go.zobrist == hash_board(go.board)
+    # White may not take back at once
+    assert not go.legal_moves_mask(2) & go.bit(1, 1)
+    assert not go.valid_place_check(1, 1, 2, test_check=True)
+    go.unmake_move()
+    assert go.board == board
+
+def test_suicide_is_not_legal():
+    board = [[0, 1, 0, 0, 0],
+             [1, 0, 0, 0, 0],
+             [0, 0, 0, 0, 0],
+             [0, 0, 0, 0, 0],
+             [0, 0, 0, 0, 0]]
+    go = new_bitboard(board)
+    assert not go.legal_moves_mask(2) & go.bit(0, 0)
+    assert go.legal_moves_mask(1) & go.bit(0, 0)
+
+def test_batch_go_steps_like_bitboard():
+    k = 16
+    rng = np.random.default_rng(3)
+    env = BatchGo(k)
+    mask = env.reset()
+    games = [new_bitboard() for _ in range(k)]
+    while not env.done.all():
+        active = ~env.done
+        for g in np.flatnonzero(active).tolist():
+            legal = mask_positions(games[g].legal_moves_mask(int(env.to_move[g])), 5)
+            assert [(p // 5, p % 5) for p in np.flatnonzero(mask[g, :25]).tolist()] == legal
+        actions = env.random_actions(mask, rng)
+        movers = env.to_move.copy()
+        mask, rewards, done = env.step(actions)
+        for g in np.flatnonzero(active).tolist():
+            action = int(actions[g])
+            games[g].make_move('PASS' if action == env.pass_action else (action // 5, action % 5), int(movers[g]))
+            assert env.boards[g].tolist() == games[g].board
+        assert env.hashes() == [go.zobrist for go in games]
+    winners = env.judge_winner()
+    assert winners.tolist() == [go.judge_winner() for go in games]
@@ -0,0 +1,30 @@
+import os
+
+from qtable import QTable
+from checkpoint import Checkpointer, training_state
+
+def checkpoint(checkpointer, table, episode, state):
+    table.visit(table.add(state, [0, 1]))
+    checkpointer.save(table, training_state(episode, 0.5, {'black': episode, 'white': 0, 'draw': 0}))
+    checkpointer.wait()
+
+def test_resume_after_a_torn_log_batch(tmp_path):
+    directory = str(tmp_path)
+    checkpointer = Checkpointer(directory)
+    table = QTable(5, 16)
+    checkpoint(checkpointer, table, 1, 1) # snapshot
+    checkpoint(checkpointer, table, 2, 2) # log batch
+    # Crash in the middle of writing the batch
+    log_file = os.path.join(directory, 'updates.log')
+    os.truncate(log_file, os.path.getsize(log_file) - 10)
+
+    checkpointer = Checkpointer(directory)
+    table, state = checkpointer.resume(QTable(5, 16))
+    assert state['episode'] == 1
+    assert sorted(table.rows) == [1]
+    checkpoint(checkpointer, table, 3, 3)
+    checkpoint(checkpointer, table, 4, 4)
+
+    table, state = Checkpointer(directory).resume(QTable(5, 16))
+    assert state['episode'] == 4
+    assert sorted(table.rows) == [1, 3, 4]
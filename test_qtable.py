@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from qtable import QTable, MappedQTable, save_binary
+
+def test_capped_prune_keeps_max_states():
+    # Most states share the same low visit count, as early in training
+    table = QTable(5, 16)
+    for state in range(1000):
+        row = table.add(state, [0, 1, 2])
+        for _ in range(1 + (state % 10 == 0)):
+            table.visit(row)
+    table.update(table.row(3), 1, 0.5)
+    removed = table.prune(1, max_states=750)
+    assert len(table) == 750
+    assert removed == 250
+    # The states visited twice and the one with a spread rank first, then the oldest
+    assert all(state in table for state in range(0, 1000, 10))
+    assert 3 in table
+    assert 999 not in table
+    rows = [table.row(state) for state in sorted(table.rows)]
+    assert rows == list(range(750))
+    assert np.all(table.keys[:750] == np.array(sorted(table.rows), dtype=np.uint64))
+
+def test_mapped_table_whole_table_operations(tmp_path):
+    table = QTable(5, 16)
+    for state in (7, 3, 1 << 63):
+        row = table.add(state, [0, 4, 25])
+        table.update(row, 4, state % 5)
+        table.visit(row)
+    save_binary(table, str(tmp_path / 'a.qtb'))
+    mapped = MappedQTable(str(tmp_path / 'a.qtb'))
+    assert mapped.to_dict() == table.to_dict()
+    assert mapped.copy().to_dict() == table.to_dict()
+    save_binary(mapped, str(tmp_path / 'b.qtb'))
+    assert (tmp_path / 'b.qtb').read_bytes() == (tmp_path / 'a.qtb').read_bytes()
+    with pytest.raises(TypeError):
+        mapped.prune(1)
@@ -0,0 +1,26 @@
+from bitboard import BitboardGO
+from my_player3 import new_go
+from tablebase import position_key
+
+def test_position_key_sees_a_capture_in_the_host_input():
+    # Black captures at (1, 2); white may not take back at (1, 1) right away (KO)
+    board = [[0, 1, 2, 0, 0],
+             [1, 2, 0, 2, 0],
+             [0, 1, 2, 0, 0],
+             [0, 0, 0, 0, 0],
+             [0, 0, 0, 0, 0]]
+    go = BitboardGO(5)
+    go.init_board(5)
+    go.board = [row[:] for row in board]
+    go.previous_board = [row[:] for row in board]
+    go.n_move = 6 # my_player3 counts the stones on the board
+    go.make_move((1, 2), 1)
+    assert go.died_pieces == [(1, 1)]
+
+    host = new_go(2, board, go.board, 7)
+    assert host.died_pieces == []
+    assert position_key(host, 2) == position_key(go, 2)
+    # The same board without the capture is another position
+    quiet = new_go(2, go.board, go.board, 7)
+    quiet.previous_board = [[0] * 5 for _ in range(5)]
+    assert position_key(quiet, 2) != position_key(go, 2)
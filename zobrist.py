@@ -0,0 +1,87 @@
+import json
+import random
+import argparse
+
+# Saved Q-tables are keyed by these hashes, so the seed must never change.
+ZOBRIST_SEED = 561
+
+_KEYS = {}
+
+def zobrist_keys(n):
+    '''
+    Get the Zobrist keys of an n*n board.
+
+    :param n: width and height of the board.
+    :return: keys[piece_type][i * n + j], a random 64-bit key for every stone (index 0 unused).
+    '''
+    if n not in _KEYS:
+        rng = random.Random(ZOBRIST_SEED * 1000 + n)
+        _KEYS[n] = [[0] * (n * n)] + [[rng.getrandbits(64) for p in range(n * n)] for piece_type in (1, 2)]
+    return _KEYS[n]
+
+def hash_board(board):
+    '''
+    Compute the Zobrist hash of a board from scratch.
+
+    :param board: board with 0 for empty, 1 for 'X' and 2 for 'O'.
+    :return: 64-bit hash of the board.
+    '''
+    n = len(board)
+    keys = zobrist_keys(n)
+    h = 0
+    for i in range(n):
+        for j in range(n):
+            if board[i][j]:
+                h ^= keys[board[i][j]][i * n + j]
+    return h
+
+def convert_q_table(q_table):
+    '''
+    Re-key a Q-table stored by str(board) with Zobrist hashes.
+
+    Tables that are already hash keyed are returned with integer keys. The
+    conversion refuses to merge two different boards that share a hash, so
+    no state or value is lost.
+
+    :param q_table: dict mapping a board string or hash to {action: q-value}.
+    :return: dict mapping the board hash to {action: q-value}.
+    '''
+    hashed = dict()
+    source = dict()
+    for state, actions in q_table.items():
+        if isinstance(state, str) and state.startswith('['):
+            h = hash_board(json.loads(state))
+        else:
+            h = int(state)
+        if h in source and source[h] != state:
+            raise ValueError('Zobrist collision between {} and {}'.format(source[h], state))
+        source[h] = state
+        hashed[h] = actions
+    return hashed
+
+def load_q_table(file_name):
+    '''
+    Load a Q-table json file, converting it to hash keys if needed.
+
+    :param file_name: q_table_black.json or q_table_white.json.
+    :return: dict mapping the board hash to {action: q-value}.
+    '''
+    q_file = open(file_name, 'r')
+    q_table = json.load(q_file)
+    q_file.close()
+    return convert_q_table(q_table)
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert str(board) keyed Q-table files to Zobrist hash keys.')
+    parser.add_argument('source', help='Q-table json file keyed by str(board)')
+    parser.add_argument('target', help='output json file keyed by the board hash')
+    args = parser.parse_args()
+
+    q_table = load_q_table(args.source)
+    q_file = open(args.target, 'w')
+    json.dump(q_table, q_file)
+    q_file.close()
+    print('Converted', len(q_table), 'states')
+
+if __name__ == '__main__':
+    main()